@@ -1,6 +1,12 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Callable, List, Dict, cast
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, List, Dict, Set, Tuple, cast
 
 from abc import ABC, abstractmethod
 
@@ -11,12 +17,21 @@ from nlScript.core.lexer import Lexer
 from nlScript.core.production import Production
 from nlScript.core.symbol import Symbol
 from nlScript.ebnf import ebnfparsednodefactory
+from nlScript.ebnf.ebnfproduction import EBNFProduction, EBNFRepetition
 from nlScript.ebnf.sequence import Sequence
 from nlScript.util.completepath import CompletePath
 from nlScript.parsednode import ParsedNode
 
 if TYPE_CHECKING:
     from nlScript.ebnf.ebnfcore import EBNFCore
+    from nlScript.ebnf.rule import Rule
+    from nlScript.util.pathprefetcher import PathPrefetcher
+
+
+# the target grammar and the cache of entire-sequence autocompletions of the Parser which is currently parsing,
+# see EntireSequenceAutocompleter
+CURRENT_GRAMMAR: ContextVar[Tuple[EBNFCore, Dict[Tuple[str, str], List[Autocompletion] or None]] or None] = \
+    ContextVar("CURRENT_GRAMMAR", default=None)
 
 
 class IAutocompleter(ABC):
@@ -24,16 +39,136 @@ class IAutocompleter(ABC):
     def getAutocompletion(self, pn: DefaultParsedNode, justCheck: bool) -> List[Autocompletion] or None:
         pass
 
+    def dependsOnGrammarOnly(self) -> bool:
+        """
+        Whether the autocompletions only depend on the grammar and the parsed text, so that they can be
+        cached (see EntireSequenceAutocompleter). Autocompleters which use other data, e.g. the file system
+        or a database, must return False.
+        """
+        return False
+
 
 class Autocompleter(IAutocompleter):
-    def __init__(self, getAutocompletion: Callable[[ParsedNode, bool], List[Autocompletion]]):
+    """
+    Wraps a function which computes autocompletions. If justCheck is False, the function may also return
+    a concurrent.futures.Future or an awaitable (e.g. be an async function), which is resolved by the parser
+    concurrently with other autocompleters, see Parser.autocompletionTimeout.
+    """
+    def __init__(self, getAutocompletion: Callable[[ParsedNode, bool], List[Autocompletion]], grammarOnly: bool = False):
         self._getAutocompletion = getAutocompletion
+        self._grammarOnly = grammarOnly
 
     def getAutocompletion(self, pn: ParsedNode, justCheck: bool) -> List[Autocompletion] or None:
         return self._getAutocompletion(pn, justCheck)
 
+    def dependsOnGrammarOnly(self) -> bool:
+        return self._grammarOnly
+
+
+class CachingAutocompleter(IAutocompleter):
+    """
+    Caches the autocompletions of another autocompleter, for autocompleters which are expensive to call,
+    e.g. because they query a database, and return the same results on every keystroke.
+
+    Results are cached by rule, name of the parsed node and the text entered so far, for at most ttl
+    seconds (forever if ttl is None). At most maxSize results are kept, the least recently used ones are
+    discarded first. Call invalidate() when the underlying data changes. Results which are Futures or
+    awaitables are cached once they are available.
+    """
+    def __init__(self,
+                 autocompleter: IAutocompleter or Callable[[ParsedNode, bool], List[Autocompletion] or None],
+                 ttl: float or None = None,
+                 maxSize: int = 128):
+        if isinstance(autocompleter, Callable):
+            autocompleter = Autocompleter(autocompleter)
+        self._autocompleter: IAutocompleter = autocompleter
+        self._ttl = ttl
+        self._maxSize = maxSize
+        # maps (rule, name, already entered text) to the expiration time and the autocompletions
+        self._cache: OrderedDict[Tuple[object, str, str], Tuple[float or None, List[Autocompletion] or None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def autocompleter(self) -> IAutocompleter:
+        return self._autocompleter
+
+    @property
+    def ttl(self) -> float or None:
+        return self._ttl
+
+    @property
+    def maxSize(self) -> int:
+        return self._maxSize
+
+    def getCacheSize(self) -> int:
+        return len(self._cache)
+
+    def getCacheHits(self) -> int:
+        return self._hits
+
+    def getCacheMisses(self) -> int:
+        return self._misses
+
+    def invalidate(self) -> None:
+        """
+        Discards all cached autocompletions.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def getKey(pn: DefaultParsedNode) -> Tuple[object, str, str]:
+        rule = pn.getRule() if isinstance(pn, ParsedNode) else pn.symbol
+        return rule, pn.name, pn.getParsedString()
+
+    def getAutocompletion(self, pn: DefaultParsedNode, justCheck: bool) -> List[Autocompletion] or None:
+        if justCheck:
+            return self._autocompleter.getAutocompletion(pn, justCheck)
+        key = CachingAutocompleter.getKey(pn)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return None if entry[1] is None else list(entry[1])
+            self._misses += 1
+
+        completion = self._autocompleter.getAutocompletion(pn, justCheck)
+        if isinstance(completion, Future):
+            completion.add_done_callback(lambda f: self.putFuture(key, f))
+            return completion
+        if inspect.isawaitable(completion):
+            return self.putWhenDone(key, completion)
+        self.put(key, completion)
+        return completion
+
+    def putFuture(self, key: Tuple[object, str, str], future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.put(key, future.result())
+
+    async def putWhenDone(self, key: Tuple[object, str, str], awaitable) -> List[Autocompletion] or None:
+        completion = await awaitable
+        self.put(key, completion)
+        return completion
+
+    def put(self, key: Tuple[object, str, str], completion: List[Autocompletion] or None) -> None:
+        expires = None if self._ttl is None else time.monotonic() + self._ttl
+        with self._lock:
+            if self._maxSize <= 0:
+                return
+            self._cache[key] = (expires, None if completion is None else list(completion))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._maxSize:
+                self._cache.popitem(last=False)
+
 
 class DefaultInlineAutocompleter(IAutocompleter):
+    def dependsOnGrammarOnly(self) -> bool:
+        return True
+
     def getAutocompletion(self, pn: DefaultParsedNode, justCheck: bool) -> List[Autocompletion] or None:
         alreadyEntered = pn.getParsedString()
         if len(alreadyEntered) > 0:
@@ -49,43 +184,38 @@ class DefaultInlineAutocompleter(IAutocompleter):
 class EntireSequenceAutocompleter(IAutocompleter):
     calledNTimes = 0
 
-    def __init__(self, ebnf: EBNFCore, symbol2Autocompletion: Dict[str, List[Autocompletion]]):
+    def __init__(self, ebnf: EBNFCore, symbol2Autocompletion: Dict[Tuple[str, str], List[Autocompletion] or None]):
+        # used unless a Parser is parsing (see CURRENT_GRAMMAR), whose grammar may differ from the one the rule
+        # was defined in, e.g. if the rule was inherited by a derived Parser
         self._ebnf = ebnf
+        # (child symbol, child name) -> autocompletions of the child on empty input, shared by all parses,
+        # or None if they depend on other data than the grammar and need to be computed for every parse
         self._symbol2Autocompletion = symbol2Autocompletion
 
-    def getAutocompletion(self, pn: DefaultParsedNode, justCheck: bool) -> List[Autocompletion] or None:
-        import nlScript
+    def getGrammar(self) -> EBNFCore:
+        current = CURRENT_GRAMMAR.get()
+        return self._ebnf if current is None else current[0]
+
+    def getCache(self) -> Dict[Tuple[str, str], List[Autocompletion] or None]:
+        current = CURRENT_GRAMMAR.get()
+        return self._symbol2Autocompletion if current is None else current[1]
 
+    def dependsOnGrammarOnly(self) -> bool:
+        # the children are checked individually, see isGrammarOnly()
+        return True
+
+    def getAutocompletion(self, pn: DefaultParsedNode, justCheck: bool) -> List[Autocompletion] or None:
         EntireSequenceAutocompleter.calledNTimes += 1
         alreadyEntered = pn.getParsedString()
 
+        # on empty input the entire sequence is always offered, no need to query the children just to check
+        if justCheck and len(alreadyEntered) == 0:
+            return []
+
         sequence = cast(ParsedNode, pn).getRule()
-        children: List[Symbol] = sequence.children
 
         entireSequenceCompletion = EntireSequence(pn)
-
-        for idx, child in enumerate(children):
-            key = child.symbol + ":" + sequence.getNameForChild(idx)
-            try:
-                autocompletionsForChild = self._symbol2Autocompletion[key]
-                entireSequenceCompletion.add(autocompletionsForChild)
-                continue
-            except KeyError:
-                pass
-
-            bnf = self._ebnf.getBNF().copy()
-            newSequence = Sequence(None, [child])
-            newSequence.setParsedChildNames([sequence.getNameForChild(idx)])
-            newSequence.createBNF(bnf)
-
-            bnf.removeStartProduction()
-            bnf.addProduction(Production(BNF.ARTIFICIAL_START_SYMBOL, [newSequence.tgt]))
-            parser = nlScript.core.rdparser.RDParser(bnf, Lexer(""), ebnfparsednodefactory.INSTANCE)
-
-            autocompletionsForChild = []
-            parser.parse(autocompletionsForChild)
-
-            self._symbol2Autocompletion[key] = autocompletionsForChild
+        for autocompletionsForChild in self.getTemplate(sequence):
             entireSequenceCompletion.add(autocompletionsForChild)
 
         # avoid to call getCompletion() more often than necessary
@@ -102,17 +232,130 @@ class EntireSequenceAutocompleter(IAutocompleter):
 
         return entireSequenceCompletion.asArray()
 
+    def getTemplate(self, sequence: Rule) -> List[List[Autocompletion]]:
+        """
+        Returns the autocompletions of each child of the given sequence on empty input. Those which only depend
+        on the grammar are computed once and cached until the owner of the cache invalidates them (see
+        Parser.compile()), the others are computed again for every call. The returned lists must not be modified.
+        """
+        return [self.getAutocompletionsForChild(sequence, idx) for idx in range(len(sequence.children))]
+
+    def precomputeTemplate(self, sequence: Rule) -> None:
+        """
+        Computes and caches the autocompletions of the children of the given sequence which only depend on the grammar.
+        """
+        cache = self.getCache()
+        for idx, child in enumerate(sequence.children):
+            key = (child.symbol, sequence.getNameForChild(idx))
+            if key in cache:
+                continue
+            if self.isGrammarOnly(child):
+                self.getAutocompletionsForChild(sequence, idx)
+            else:
+                cache[key] = None
+
+    def isGrammarOnly(self, symbol: Symbol) -> bool:
+        """
+        Whether the autocompletions of the given symbol only depend on the grammar, i.e. whether none of the rules
+        it derives (directly or indirectly) has an autocompleter which depends on other data.
+        """
+        bnf = self.getGrammar().getBNF()
+        visited: Set[str] = set()
+        stack: List[Symbol] = [symbol]
+        while len(stack) > 0:
+            s = stack.pop()
+            if s.isTerminal() or s.symbol in visited:
+                continue
+            visited.add(s.symbol)
+            for production in bnf.getProductionsOf(s.symbol):
+                if isinstance(production, (EBNFProduction, EBNFRepetition)):
+                    autocompleter = production.rule.getAutocompleter()
+                    if autocompleter is not None and not autocompleter.dependsOnGrammarOnly():
+                        return False
+                stack.extend(production.right)
+        return True
+
+    def getAutocompletionsForChild(self, sequence: Rule, idx: int) -> List[Autocompletion]:
+        import nlScript
+
+        child: Symbol = sequence.children[idx]
+        name = sequence.getNameForChild(idx)
+        key = (child.symbol, name)
+        cache = self.getCache()
+        cached = cache.get(key, False)
+        if isinstance(cached, list):
+            return cached
+        # not computed yet (False), or depending on other data than the grammar (None)
+        grammarOnly = cached is False and self.isGrammarOnly(child)
+
+        # parse empty input with the child as the start symbol, in a temporary layer on top of the grammar
+        bnf = self.getGrammar().getBNF().derive()
+        newSequence = Sequence(None, [child])
+        newSequence.nameAnonymousTarget(bnf)
+        newSequence.setParsedChildNames([name])
+        newSequence.createBNF(bnf)
+
+        bnf.removeStartProduction()
+        bnf.addProduction(Production(BNF.ARTIFICIAL_START_SYMBOL, [newSequence.tgt, BNF.ARTIFICIAL_STOP_SYMBOL]))
+        parser = nlScript.core.rdparser.RDParser(bnf, Lexer(""), ebnfparsednodefactory.INSTANCE)
+
+        autocompletionsForChild = []
+        parser.parse(autocompletionsForChild)
+
+        # concurrent parses may compute the same entry, which is harmless, because the results are equivalent
+        cache[key] = autocompletionsForChild if grammarOnly else None
+        return autocompletionsForChild
+
 
 class PathAutocompleter(IAutocompleter):
-    def __init__(self):
-        pass
+    def __init__(self, maxCompletions: int or None = None, prefetcher: PathPrefetcher or None = None):
+        self._maxCompletions = maxCompletions
+        self._prefetcher = prefetcher
+
+    @property
+    def maxCompletions(self) -> int or None:
+        """
+        The maximum number of paths offered as completions, or None for all.
+        Further paths can be obtained on demand with CompletePath.getCompletion(path, limit, offset).
+        """
+        return self._maxCompletions
+
+    @maxCompletions.setter
+    def maxCompletions(self, maxCompletions: int or None) -> None:
+        self._maxCompletions = maxCompletions
+
+    @property
+    def prefetcher(self) -> PathPrefetcher or None:
+        """
+        If set, the directories which are likely needed for the next completion are listed in the background.
+        """
+        return self._prefetcher
+
+    @prefetcher.setter
+    def prefetcher(self, prefetcher: PathPrefetcher or None) -> None:
+        self._prefetcher = prefetcher
 
     def getAutocompletion(self, pn: DefaultParsedNode, justCheck: bool) -> List[Autocompletion] or None:
         if justCheck:
             return Autocompletion.doesAutocomplete(pn)
-        completion: List[str] = CompletePath.getCompletion(pn.getParsedString())
+        alreadyEntered = pn.getParsedString()
+        if self._prefetcher is not None:
+            parent = CompletePath.getParent(alreadyEntered)
+            if parent is not None:
+                self._prefetcher.waitFor(parent)
+        completion: List[str] = CompletePath.getCompletion(alreadyEntered, self._maxCompletions)
+        if self._prefetcher is not None:
+            self._prefetcher.prefetchSubdirectories(completion)
         return Autocompletion.literal(pn, completion)
 
+    @staticmethod
+    def clearFilesystemCache() -> None:
+        CompletePath.clearFilesystemCache()
+
+    @staticmethod
+    def invalidate(directory: str) -> None:
+        CompletePath.invalidate(directory)
+
 
 DEFAULT_INLINE_AUTOCOMPLETER = DefaultInlineAutocompleter()
 
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import heapq
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from nlScript.core.autocompletion import Purpose
+
+if TYPE_CHECKING:
+    from nlScript.core.autocompletion import Autocompletion
+
+
+class ContinuationToken:
+    """
+    Refers to the remaining autocompletions of a CompletionPage, see CompletionRanker.getNextPage().
+    """
+
+    def __init__(self, candidates: List[Tuple[Tuple[int, int, int], Autocompletion]], offset: int, isSorted: bool = False):
+        self._candidates = candidates
+        self._offset = offset
+        self._sorted = isSorted
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    def getSorted(self) -> List[Tuple[Tuple[int, int, int], Autocompletion]]:
+        # the candidates are only sorted completely if more than the first page is requested
+        if not self._sorted:
+            self._candidates.sort(key=lambda c: c[0])
+            self._sorted = True
+        return self._candidates
+
+
+class CompletionPage:
+    def __init__(self, autocompletions: List[Autocompletion], continuationToken: ContinuationToken or None):
+        self._autocompletions = autocompletions
+        self._continuationToken = continuationToken
+
+    @property
+    def autocompletions(self) -> List[Autocompletion]:
+        return self._autocompletions
+
+    @property
+    def continuationToken(self) -> ContinuationToken or None:
+        """
+        The token to pass to CompletionRanker.getNextPage() to obtain further autocompletions,
+        or None if this is the last page.
+        """
+        return self._continuationToken
+
+    def hasMore(self) -> bool:
+        return self._continuationToken is not None
+
+
+class CompletionRanker:
+    """
+    Orders autocompletions for display: completions which start with the text entered so far come first
+    (case-sensitive matches before case-insensitive ones), then the ones which were used more often (see
+    recordUsage()), and otherwise the order in which the parser found them.
+
+    getPage() only returns the first maxResults autocompletions, which are selected without sorting all of
+    them; the remaining ones can be fetched with getNextPage().
+    """
+
+    def __init__(self, maxResults: int or None = None):
+        self._maxResults = maxResults
+        self._usageCounts: Dict[str, int] = {}
+
+    @property
+    def maxResults(self) -> int or None:
+        return self._maxResults
+
+    @maxResults.setter
+    def maxResults(self, maxResults: int or None) -> None:
+        self._maxResults = maxResults
+
+    def recordUsage(self, autocompletion: Autocompletion) -> None:
+        key = autocompletion.getCompletion(Purpose.FOR_INSERTION)
+        self._usageCounts[key] = self._usageCounts.get(key, 0) + 1
+
+    def getUsageCount(self, autocompletion: Autocompletion) -> int:
+        return self._usageCounts.get(autocompletion.getCompletion(Purpose.FOR_INSERTION), 0)
+
+    def clearUsage(self) -> None:
+        self._usageCounts.clear()
+
+    def getRankKey(self, autocompletion: Autocompletion, index: int) -> Tuple[int, int, int]:
+        alreadyEntered = autocompletion.getAlreadyEnteredText()
+        completion = autocompletion.getCompletion(Purpose.FOR_MENU)
+        if completion.startswith(alreadyEntered):
+            prefixMatch = 0
+        elif completion.lower().startswith(alreadyEntered.lower()):
+            prefixMatch = 1
+        else:
+            prefixMatch = 2
+        return prefixMatch, -self.getUsageCount(autocompletion), index
+
+    def rank(self, autocompletions: List[Autocompletion]) -> List[Autocompletion]:
+        """
+        Returns all the given autocompletions, in ranked order.
+        """
+        candidates = [(self.getRankKey(ac, i), ac) for i, ac in enumerate(autocompletions)]
+        candidates.sort(key=lambda c: c[0])
+        return [c[1] for c in candidates]
+
+    def getPage(self, autocompletions: List[Autocompletion]) -> CompletionPage:
+        """
+        Returns the first maxResults of the given autocompletions, in ranked order.
+        """
+        candidates = [(self.getRankKey(ac, i), ac) for i, ac in enumerate(autocompletions)]
+        n = self._maxResults
+        if n is None or n >= len(candidates):
+            candidates.sort(key=lambda c: c[0])
+            return CompletionPage([c[1] for c in candidates], None)
+        top = heapq.nsmallest(n, candidates, key=lambda c: c[0])
+        return CompletionPage([c[1] for c in top], ContinuationToken(candidates, n))
+
+    def getNextPage(self, continuationToken: ContinuationToken) -> CompletionPage:
+        """
+        Returns the next maxResults autocompletions after the page the given token belongs to.
+        The ranking is the one of the first page.
+        """
+        candidates = continuationToken.getSorted()
+        offset = continuationToken.offset
+        end = len(candidates) if self._maxResults is None else min(len(candidates), offset + self._maxResults)
+        nextToken = ContinuationToken(candidates, end, True) if end < len(candidates) else None
+        return CompletionPage([c[1] for c in candidates[offset:end]], nextToken)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import bisect
+from typing import TYPE_CHECKING, List
+
+from nlScript.core.parsingstate import ParsingState
+from nlScript.parseexception import ParseException
+
+if TYPE_CHECKING:
+    from nlScript.core.autocompletion import Autocompletion
+    from nlScript.ebnf.ebnf import EBNF
+    from nlScript.parsednode import ParsedNode
+    from nlScript.parser import Parser
+
+
+class CompletionSession:
+    """
+    Computes autocompletions for a text which is edited incrementally, e.g. in an editor on every keystroke.
+
+    After each call to autocomplete(), the session remembers checkpoints: the positions after the line
+    breaks which follow completely parsed sentences. The next call only parses the text from the last
+    checkpoint which lies within the unchanged prefix of the text, so typing at the end of a long script
+    costs about as much as parsing its last sentence.
+
+    Parsing from a checkpoint skips the sentences before it, so the session always parses the entire
+    text if the parser has parse start listeners or rules with onSuccessfulParsed listeners, which might
+    depend on them. Likewise, if parsing from a checkpoint fails, the entire text is parsed again, so that
+    a ParseException refers to positions in the entire text.
+    """
+
+    def __init__(self, parser: Parser):
+        self._parser = parser
+        self._text = ""
+        self._checkpoints: List[int] = []
+        self._offset = 0
+        self._grammar: EBNF or None = None
+        self._modCount = -1
+
+    @property
+    def parser(self) -> Parser:
+        return self._parser
+
+    def getCheckpoints(self) -> List[int]:
+        return self._checkpoints.copy()
+
+    def getOffset(self) -> int:
+        """
+        Returns the position in the text at which the last call to autocomplete() started parsing.
+        """
+        return self._offset
+
+    def reset(self) -> None:
+        self._text = ""
+        self._checkpoints = []
+        self._offset = 0
+
+    def canResume(self) -> bool:
+        """
+        Whether parsing may start at a checkpoint, i.e. the grammar did not change and nothing
+        listens to the parsing of the skipped sentences.
+        """
+        grammar = self._parser.targetGrammar
+        if grammar is not self._grammar or grammar.getModCount() != self._modCount:
+            return False
+        return not self._parser.hasParseStartListeners() and len(grammar.getRulesWithListeners()) == 0
+
+    def autocomplete(self, text: str) -> List[Autocompletion]:
+        """
+        Returns the autocompletions at the end of the given text. Raises a ParseException if the text cannot be parsed.
+        """
+        if not self.canResume():
+            self.reset()
+        offset = self.getResumePosition(text)
+        autocompletions: List[Autocompletion] = []
+        try:
+            root = self._parser.parse(text[offset:], autocompletions)
+        except ParseException:
+            self.reset()
+            if offset == 0:
+                raise
+            offset = 0
+            autocompletions = []
+            root = self._parser.parse(text, autocompletions)
+
+        grammar = self._parser.targetGrammar
+        self._grammar = grammar
+        self._modCount = grammar.getModCount()
+        self._text = text
+        self._offset = offset
+        self.addCheckpoints(root, text, offset)
+        return autocompletions
+
+    def getResumePosition(self, text: str) -> int:
+        """
+        Discards the checkpoints which are not within the unchanged prefix of the given text,
+        and returns the last remaining one, or 0.
+        """
+        if text.startswith(self._text):
+            common = len(self._text)
+        else:
+            # the checkpoints are sorted, and if the text before one of them changed, it also changed before all later ones
+            lo, hi = 0, len(self._checkpoints)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if text.startswith(self._text[:self._checkpoints[mid]]):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            common = self._checkpoints[lo - 1] if lo > 0 else 0
+        del self._checkpoints[bisect.bisect_right(self._checkpoints, common):]
+        return self._checkpoints[-1] if len(self._checkpoints) > 0 else 0
+
+    def addCheckpoints(self, root: ParsedNode, text: str, offset: int) -> None:
+        if root.numChildren() == 0:
+            return
+        program = root.getChild(0)
+        if program.symbol != self._parser.targetGrammar.getSymbol("program"):
+            # compiled for another top-level symbol, whose children are not sentences
+            return
+        for sentence in program.children:
+            matcher = sentence.matcher
+            if matcher.state != ParsingState.SUCCESSFUL:
+                break
+            end = offset + matcher.pos + len(matcher.parsed)
+            if end < len(text) and text[end] == "\n" and (len(self._checkpoints) == 0 or end + 1 > self._checkpoints[-1]):
+                self._checkpoints.append(end + 1)
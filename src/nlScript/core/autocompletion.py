@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import TYPE_CHECKING, cast, List
+from typing import TYPE_CHECKING, cast, List, Dict
 
 from nlScript.core.named import Named
 from nlScript.parsednode import ParsedNode
@@ -113,9 +113,12 @@ class EntireSequence(Autocompletion):
         super().__init__(pn, forSymbol, symbolName)
         self._sequence = sequence if pn is None else cast(ParsedNode, pn).getRule()
         self._sequenceOfCompletions: List[List[Autocompletion]] = []
+        # the completion strings by purpose, which are requested many times (e.g. for deduplication and ranking)
+        self._completions: Dict[Purpose, str] = {}
 
     def add(self, completions: [Autocompletion]) -> None:
         self._sequenceOfCompletions.append(completions)
+        self._completions.clear()
 
     def getSequenceOfCompletions(self) -> List[List[Autocompletion]]:
         return self._sequenceOfCompletions
@@ -131,6 +134,13 @@ class EntireSequence(Autocompletion):
 
     # override abstract method
     def getCompletion(self, purpose: Purpose) -> str:
+        autocompletionString = self._completions.get(purpose)
+        if autocompletionString is None:
+            autocompletionString = self.createCompletion(purpose)
+            self._completions[purpose] = autocompletionString
+        return autocompletionString
+
+    def createCompletion(self, purpose: Purpose) -> str:
         autocompletionString: str = ""
         for i, autocompletions in enumerate(self._sequenceOfCompletions):
             n = len(autocompletions)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, TYPE_CHECKING, Set
+from typing import Dict, Iterable, List, TYPE_CHECKING, Set
 
 import logging
 
@@ -20,47 +20,225 @@ class BNF:
     ARTIFICIAL_START_SYMBOL = NonTerminal("$'")
     ARTIFICIAL_STOP_SYMBOL = END_OF_INPUT
 
-    def __init__(self, other: BNF = None):
-        self._symbols: {Symbol}         = {} if other is None else other._symbols.copy()
-        self._productions: [Production] = [] if other is None else other._productions.copy()
+    def __init__(self, other: BNF = None, parent: BNF = None):
+        # the layer below this one, see derive(); productions which are not changed in this layer are looked up there
+        self._parent: BNF or None = parent if other is None else other._parent
+        self._symbols: Dict[str, Symbol] = {} if other is None else other._symbols.copy()
+        # used as an insertion-ordered set, mapping each production to the stored (equal) instance
+        self._productions: Dict[Production, Production] = {} if other is None else other._productions.copy()
+        # productions indexed by the symbol of their left-hand side, in insertion order; in a layer, the
+        # complete list of a symbol is copied from the parent when it is first changed
+        self._productionsByLeft: Dict[str, List[Production]] = {} if other is None else \
+            {left: productions.copy() for left, productions in other._productionsByLeft.items()}
+        # reverse dependencies: productions indexed by the symbols on their right-hand side
+        self._references: Dict[str, Dict[Production, None]] = {} if other is None else \
+            {symbol: productions.copy() for symbol, productions in other._references.items()}
+        # productions of the parent which are hidden in this layer
+        self._removed: Dict[Production, None] = {} if other is None else other._removed.copy()
+        # the names of the symbols of this grammar, so that symbols with equal names share the same string, see intern()
+        self._names: Dict[str, str] = {} if other is None else other._names.copy()
+        # number of anonymous symbols created so far per structure, keyed by their base name, see makeAnonymousSymbol()
+        self._anonymousCounts: Dict[str, int] = {} if other is None else other._anonymousCounts.copy()
 
     def copy(self):
         return BNF(other=self)
 
+    def derive(self) -> BNF:
+        """
+        Returns a new, empty layer on top of this BNF, which initially has the same productions. Changes to the
+        layer only affect the layer, so this BNF must not be modified anymore while layers on top of it exist.
+        """
+        return BNF(parent=self)
+
+    def getParent(self) -> BNF or None:
+        return self._parent
+
     def reset(self) -> None:
+        self._parent = None
         self._symbols.clear()
         self._productions.clear()
+        self._productionsByLeft.clear()
+        self._references.clear()
+        self._removed.clear()
 
     def removeStartProduction(self):
-        for i in range(len(self._productions) - 1, -1, -1):
-            if self._productions[i].left == BNF.ARTIFICIAL_START_SYMBOL:
-                del(self._productions[i])
-                break
-
-    def removeProductions(self, productions: Set[Production]) -> None:
-        self._productions[:] = [p for p in self._productions if p not in productions]
+        productions = self.getProductions(BNF.ARTIFICIAL_START_SYMBOL)
+        if productions:
+            self.removeProductions({productions[-1]})
+
+    def removeProductions(self, productions: Set[Production]) -> Set[str]:
+        """
+        Removes the given productions, together with symbols which are not used anymore.
+        Returns the symbols on the right-hand sides of the removed productions, i.e. the
+        symbols which might not be referenced anymore.
+        """
+        removed: Set[Production] = set()
+        lefts: Set[str] = set()
+        rights: Set[str] = set()
+        for p in productions:
+            stored = self._productions.pop(p, None)
+            if stored is None and self._parent is not None and p not in self._removed:
+                stored = self._parent.findProduction(p)
+                if stored is not None:
+                    self._removed[stored] = None
+            if stored is None:
+                continue
+            removed.add(stored)
+            lefts.add(stored.left.symbol)
+            for s in stored.right:
+                if not s.isEpsilon():
+                    references = self.getLayerReferences(s.symbol)
+                    references.pop(stored, None)
+                    if len(references) == 0 and self._parent is None:
+                        del self._references[s.symbol]
+                    rights.add(s.symbol)
+        for left in lefts:
+            remaining = [p for p in self.getLayerProductions(left) if p not in removed]
+            if remaining or self._parent is not None:
+                self._productionsByLeft[left] = remaining
+            else:
+                del self._productionsByLeft[left]
+        for symbol in lefts | rights:
+            if symbol in self._symbols and not self.getProductionsOf(symbol) and not self.isReferencedBy(symbol):
+                del self._symbols[symbol]
+        return rights
 
     def addProduction(self, p: Production) -> Production:
-        try:
-            pIdx = self._productions.index(p)
-            logger.info("production is already there...", str(self._productions[pIdx]))
-            return self._productions[pIdx]
-        except ValueError:
-            self._productions.append(p)
-            self._symbols[p.left.symbol] = p.left
-            for s in p.right:
-                if not s.isEpsilon():
-                    self._symbols[s.symbol] = s
-            return p
+        existing = self.findProduction(p)
+        if existing is not None:
+            logger.info("production is already there... %s", existing)
+            return existing
+        self._productions[p] = p
+        self.intern(p.left)
+        self.getLayerProductions(p.left.symbol).append(p)
+        self._symbols[p.left.symbol] = p.left
+        for s in p.right:
+            if not s.isEpsilon():
+                self.intern(s)
+                self._symbols[s.symbol] = s
+                self.getLayerReferences(s.symbol)[p] = None
+        return p
+
+    def intern(self, symbol: Symbol) -> None:
+        """
+        Makes the given symbol use the same name string as the other symbols of this grammar with an equal name.
+        """
+        bnf = self
+        while bnf is not None:
+            name = bnf._names.get(symbol.symbol)
+            if name is not None:
+                symbol.intern(name)
+                return
+            bnf = bnf._parent
+        self._names[symbol.symbol] = symbol.symbol
+
+    def makeAnonymousSymbol(self, prefix: str, structure: Iterable[Symbol or None] = ()) -> str:
+        """
+        Returns a name for an anonymous symbol of this grammar, derived from a prefix and the symbols it is built from,
+        see NonTerminal.makeAnonymousSymbol(). Symbols with the same structure are numbered in creation order, so that
+        the same sequence of grammar definitions results in the same names.
+        """
+        name = NonTerminal.makeAnonymousSymbol(prefix, structure)
+        # counting per name (rather than per structure) also disambiguates hash collisions
+        n = self.getAnonymousCount(name)
+        self._anonymousCounts[name] = n + 1
+        return name if n == 0 else name + "." + str(n)
+
+    def getAnonymousCount(self, name: str) -> int:
+        bnf = self
+        while bnf is not None:
+            n = bnf._anonymousCounts.get(name)
+            if n is not None:
+                return n
+            bnf = bnf._parent
+        return 0
+
+    def findProduction(self, p: Production) -> Production or None:
+        """
+        Returns the stored production which is equal to p, or None.
+        """
+        existing = self._productions.get(p)
+        if existing is None and self._parent is not None and p not in self._removed:
+            existing = self._parent.findProduction(p)
+        return existing
+
+    def getLayerProductions(self, left: str) -> List[Production]:
+        """
+        Returns the modifiable list of productions of the given symbol in this layer,
+        copying it from the parent if necessary.
+        """
+        productions = self._productionsByLeft.get(left)
+        if productions is None:
+            productions = [] if self._parent is None else self._parent.getProductionsOf(left).copy()
+            self._productionsByLeft[left] = productions
+        return productions
+
+    def getLayerReferences(self, symbol: str) -> Dict[Production, None]:
+        """
+        Returns the modifiable productions referencing the given symbol in this layer,
+        copying them from the parent if necessary.
+        """
+        references = self._references.get(symbol)
+        if references is None:
+            references = {} if self._parent is None else dict.fromkeys(self._parent.getReferencesOf(symbol))
+            self._references[symbol] = references
+        return references
+
+    def numProductions(self) -> int:
+        n = len(self._productions)
+        if self._parent is not None:
+            n += self._parent.numProductions() - len(self._removed)
+        return n
+
+    def getAllProductions(self) -> List[Production]:
+        ret = [] if self._parent is None else [p for p in self._parent.getAllProductions() if p not in self._removed]
+        ret.extend(self._productions)
+        return ret
+
+    def getReferences(self, symbol: Symbol) -> List[Production]:
+        """
+        Returns the productions which have the given symbol on their right-hand side.
+        """
+        return list(self.getReferencesOf(symbol.symbol))
+
+    def getReferencesOf(self, symbol: str) -> Iterable[Production]:
+        references = self._references.get(symbol)
+        if references is None:
+            return () if self._parent is None else self._parent.getReferencesOf(symbol)
+        return references
+
+    def isReferenced(self, symbol: Symbol) -> bool:
+        return self.isReferencedBy(symbol.symbol)
+
+    def isReferencedBy(self, symbol: str) -> bool:
+        references = self._references.get(symbol)
+        if references is None:
+            return self._parent is not None and self._parent.isReferencedBy(symbol)
+        return len(references) > 0
 
     def getSymbol(self, symbol: str) -> Symbol:
-        ret = self._symbols[symbol]
+        ret = self._symbols.get(symbol)
+        if ret is None and self._parent is not None:
+            return self._parent.getSymbol(symbol)
         if ret is None:
             raise Exception("Could not find symbol " + symbol)
         return ret
 
     def getProductions(self, left: NonTerminal) -> List[Production]:
-        return [p for p in self._productions if p.left == left]
+        """
+        Returns a copy of the productions of the given symbol, which may be modified by the caller.
+        """
+        return list(self.getProductionsOf(left.symbol))
+
+    def getProductionsOf(self, left: str) -> List[Production]:
+        """
+        Returns the productions of the given symbol without copying them, for read-only use while parsing:
+        the returned list must not be modified, it may belong to this grammar or (for a derived grammar) to its parent.
+        """
+        productions = self._productionsByLeft.get(left)
+        if productions is None:
+            return [] if self._parent is None else self._parent.getProductionsOf(left)
+        return productions
 
     def __str__(self) -> str:
-        return "\n".join(list(map(lambda x: str(x), self._productions))) + "\n"
+        return "\n".join(list(map(lambda x: str(x), self.getAllProductions()))) + "\n"
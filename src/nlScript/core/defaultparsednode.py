@@ -1,4 +1,6 @@
 from __future__ import annotations
+
+import inspect
 from typing import TYPE_CHECKING, cast
 
 from nlScript.core.named import Named
@@ -43,7 +45,11 @@ class DefaultParsedNode:
         return self._matcher
 
     def doesAutocomplete(self) -> bool:
-        return self.getAutocompletion(True) is not None
+        check = self.getAutocompletion(True)
+        if inspect.iscoroutine(check):
+            # an asynchronous autocompleter which does not distinguish justCheck
+            check.close()
+        return check is not None
 
     def getAutocompletion(self, justCheck: bool) -> List[Autocompletion] or None:
         from nlScript.core.autocompletion import Autocompletion
@@ -1,7 +1,13 @@
+import bisect
+from typing import List, Tuple
+
+
 class Lexer:
     def __init__(self, input: str):
         self._input = input
         self._pos = 0
+        # the positions at which lines start, see getLineOffsets()
+        self._lineOffsets: List[int] or None = None
 
     @property
     def pos(self) -> int:
@@ -31,6 +37,37 @@ class Lexer:
     def isAtEnd(self, fwd: int = 0) -> bool:
         return self._pos + fwd == len(self._input)
 
+    def getLineOffsets(self) -> List[int]:
+        """
+        Returns the positions at which the lines of the input start, with line boundaries as in str.splitlines().
+        They are computed on first use.
+        """
+        if self._lineOffsets is None:
+            offsets = [0]
+            for line in self._input.splitlines(keepends=True):
+                offsets.append(offsets[-1] + len(line))
+            self._lineOffsets = offsets
+        return self._lineOffsets
+
+    def getLine(self, line: int) -> str:
+        """
+        Returns the given (0-based) line of the input, without its line terminator.
+        """
+        offsets = self.getLineOffsets()
+        if line + 1 >= len(offsets):
+            return ""
+        text = self._input[offsets[line]:offsets[line + 1]]
+        lines = text.splitlines()
+        return lines[0] if len(lines) > 0 else ""
+
+    def getLineAndColumn(self, pos: int) -> Tuple[int, int]:
+        """
+        Returns the (0-based) line and column of the given position in the input.
+        """
+        offsets = self.getLineOffsets()
+        line = bisect.bisect_right(offsets, pos) - 1
+        return line, pos - offsets[line]
+
     def __str__(self) -> str:
         return self._input[0: self._pos] + " -- " + self._input[self._pos:]
 
@@ -3,6 +3,8 @@ from nlScript.core.parsingstate import ParsingState
 
 
 class Matcher:
+    __slots__ = ("_state", "_pos", "_parsed")
+
     def __init__(self, state: ParsingState, pos: int, parsed: str):
         self._state = state
         self._pos = pos
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Set, List, cast
+import zlib
+from typing import Set, List, cast, Iterable
 
 from nlScript.core.production import Production
 from nlScript.core.symbol import Symbol
@@ -33,7 +34,7 @@ class NonTerminal(Symbol):
     def uses(self, symbol: Symbol, bnf: BNF, progressing: Set[Production]=None) -> bool:
         if progressing is None:
             progressing = set()
-        productions: List[Production] = bnf.getProductions(self)
+        productions: List[Production] = bnf.getProductionsOf(self.symbol)
         for p in productions:
             if p in progressing:
                 continue
@@ -54,6 +55,16 @@ class NonTerminal(Symbol):
     def makeRandomSymbol() -> str:
         return NonTerminal.rs.nextString()
 
+    @staticmethod
+    def makeAnonymousSymbol(prefix: str, structure: Iterable[Symbol or None] = ()) -> str:
+        """
+        Returns a name for an anonymous symbol, derived from a prefix and the symbols it is built from,
+        which is the same in every process. Symbols with the same structure get the same name; see
+        BNF.makeAnonymousSymbol() for names which are unique within a grammar.
+        """
+        key = prefix + "\0" + "\0".join("" if s is None else s.symbol for s in structure)
+        return prefix + ":" + format(zlib.crc32(key.encode("utf-8")), "08x")
+
 
 if __name__ == '__main__':
     nt = NonTerminal()
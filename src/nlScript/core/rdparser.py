@@ -1,22 +1,31 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, cast, Set
+from typing import TYPE_CHECKING, List, cast, Set, Dict, Tuple
 
+from nlScript.core.lexer import Lexer
 from nlScript.core.parsingstate import ParsingState
 from nlScript.core.matcher import Matcher
 from nlScript.core.bnf import BNF
 from nlScript.core.nonterminal import NonTerminal
+from nlScript.core.repetition import Repetition, RepetitionContinuation
 from nlScript.core.terminal import Terminal
 from nlScript.core.autocompletion import Autocompletion, Veto, Purpose
 
+import asyncio
+import contextvars
+import gc
+import inspect
 import sys
+import threading
+import time
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
 
 from nlScript.parseexception import ParseException
 
 sys.setrecursionlimit(500)
 
 if TYPE_CHECKING:
-    from nlScript.core.lexer import Lexer
     from nlScript.core.parsednodefactory import ParsedNodeFactory
     from nlScript.core.defaultparsednode import DefaultParsedNode
     from nlScript.core.symbol import Symbol
@@ -29,6 +38,16 @@ class RDParser:
         self._grammar = grammar
         self._lexer = lexer
         self._parsedNodeFactory = parsedNodeFactory
+        self._suspendGC = False
+        self._autocompletionTimeout: float or None = None
+        # per-parse caches: matchers by (terminal, lexer position), and the alternatives for each non-terminal
+        self._matcherCache: Dict[Tuple[int, int], Matcher] = {}
+        self._alternatives: Dict[int, List[Tuple[Production, List[Symbol], bool]]] = {}
+        # the sequences whose next terminal failed at the furthest position where any terminal failed, see getExpectations()
+        self._furthestFailurePos = -1
+        self._furthestFailures: List[SymbolSequence] = []
+        # the context of the last parse, in which autocompleters run when they are asked for expectations afterwards
+        self._parseContext: contextvars.Context or None = None
 
     def getLexer(self) -> Lexer:
         return self._lexer
@@ -39,18 +58,49 @@ class RDParser:
     def getParsedNodeFactory(self) -> ParsedNodeFactory:
         return self._parsedNodeFactory
 
+    @property
+    def suspendGC(self) -> bool:
+        """
+        Whether the cyclic garbage collector is disabled while parsing, to avoid collection pauses
+        caused by the many short-lived objects a parse creates.
+        """
+        return self._suspendGC
+
+    @suspendGC.setter
+    def suspendGC(self, suspendGC: bool) -> None:
+        self._suspendGC = suspendGC
+
+    @property
+    def autocompletionTimeout(self) -> float or None:
+        """
+        The time in seconds to wait for autocompleters which return a Future or an awaitable.
+        Results which are not available in time are cancelled and dropped. None waits for all of them.
+        """
+        return self._autocompletionTimeout
+
+    @autocompletionTimeout.setter
+    def autocompletionTimeout(self, autocompletionTimeout: float or None) -> None:
+        self._autocompletionTimeout = autocompletionTimeout
+
     def parse(self, autocompletions: List[Autocompletion] = None) -> DefaultParsedNode:
-        seq = SymbolSequence(BNF.ARTIFICIAL_START_SYMBOL)
-        endOfInput: List[SymbolSequence] = []
-        parsedSequence = self.parseRecursive(seq, endOfInput)
-        if autocompletions is not None:
-            self.collectAutocompletions(endOfInput, autocompletions)
-        last: List[DefaultParsedNode or None] = [None]
-        ret = self.createParsedTree(parsedSequence, last)
-        ret = self.buildAst(ret)
-        if ret.matcher.state == ParsingState.FAILED:
-            raise ParseException(ret, last[0], self)
-        return ret
+        with gcSuspended(self._suspendGC):
+            self._matcherCache.clear()
+            self._alternatives.clear()
+            self._furthestFailurePos = -1
+            self._furthestFailures = []
+            self._parseContext = contextvars.copy_context()
+            seq = SymbolSequence(BNF.ARTIFICIAL_START_SYMBOL)
+            endOfInput: Dict[Tuple, SymbolSequence] or None = {} if autocompletions is not None else None
+            parsedSequence = self.parseBacktracking(seq, endOfInput)
+            self._matcherCache.clear()
+            if autocompletions is not None:
+                self.collectAutocompletions(list(endOfInput.values()), autocompletions)
+            last: List[DefaultParsedNode or None] = [None]
+            ret = self.createParsedTree(parsedSequence, last)
+            ret = self.buildAst(ret)
+            if ret.matcher.state == ParsingState.FAILED:
+                raise ParseException(ret, last[0], self)
+            return ret
 
     def buildAst(self, pn: DefaultParsedNode) -> DefaultParsedNode:
         children = []
@@ -64,23 +114,167 @@ class RDParser:
         return pn
 
     def collectAutocompletions(self, endOfInput: List[SymbolSequence], autocompletions: List[Autocompletion]) -> None:
-        autocompletingParents: List[DefaultParsedNode] = []
+        """
+        Adds the autocompletions for the sequences which reached the end of the input. These are
+        already unique with respect to their derivation (see getFrontierKey()), and only one
+        autocompleting parent per production is asked for completions.
+        Autocompleters which return a Future or an awaitable run concurrently (see resolveAutocompletions()),
+        their results are added in the same order as if they had returned immediately.
+        """
+        doneProductions: Set[Production] = set()
+        doneSymbols: Set[str] = set()
+        completions: List[Tuple[DefaultParsedNode, object]] = []
         for seq in endOfInput:
+            autocompletingParents: List[DefaultParsedNode] = []
             self.collectAutocompletingParents(seq, autocompletingParents)
-        done: Set[str] = set()
-        for autocompletingParent in autocompletingParents:
+            if len(autocompletingParents) == 0:
+                continue
+            autocompletingParent = autocompletingParents[0]
             prod = autocompletingParent.production
             if prod is not None:
-                key = prod.left.symbol + ":"
-                for s in prod.right:
-                    key = key + s.symbol
+                if prod in doneProductions:
+                    continue
+                doneProductions.add(prod)
             else:
-                key = autocompletingParent.symbol.symbol
-            if key not in done:
-                veto: bool = self.addAutocompletions(autocompletingParent, autocompletions)
-                done.add(key)
-                if veto:
-                    break
+                symbol = autocompletingParent.symbol.symbol
+                if symbol in doneSymbols:
+                    continue
+                doneSymbols.add(symbol)
+            completion = autocompletingParent.getAutocompletion(False)
+            completions.append((autocompletingParent, completion))
+            if isinstance(completion, list) and any(map(lambda c: isinstance(c, Veto), completion)):
+                break
+
+        self.resolveAutocompletions(completions)
+        seen: Set[str] = set(map(lambda x: x.getCompletion(Purpose.FOR_MENU), autocompletions))
+        for autocompletingParent, completion in completions:
+            veto: bool = self.addAutocompletions(autocompletingParent, completion, autocompletions, seen)
+            if veto:
+                break
+
+    def resolveAutocompletions(self, completions: List[Tuple[DefaultParsedNode, object]]) -> None:
+        """
+        Replaces the Futures and awaitables returned by autocompleters by their results. They are awaited
+        concurrently, until autocompletionTimeout has passed; awaitables run in an event loop in a separate
+        thread, so that this also works when called from within a running event loop. Results which are
+        not available in time, or which were cancelled, are replaced by None. If one of them raised an
+        exception, it is re-raised.
+        """
+        pending: Dict[int, Future] = {}
+        awaitables: Dict[int, object] = {}
+        for i, (_, completion) in enumerate(completions):
+            if isinstance(completion, Future):
+                pending[i] = completion
+            elif inspect.isawaitable(completion):
+                awaitables[i] = completion
+        if len(pending) == 0 and len(awaitables) == 0:
+            return
+
+        deadline = None if self._autocompletionTimeout is None else time.monotonic() + self._autocompletionTimeout
+        loop: asyncio.AbstractEventLoop or None = None
+        if len(awaitables) > 0:
+            loop = RDParser.startEventLoop()
+            for i, awaitable in awaitables.items():
+                pending[i] = asyncio.run_coroutine_threadsafe(RDParser.awaitAutocompletion(awaitable), loop)
+        error: BaseException or None = None
+        try:
+            wait(pending.values(), timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        finally:
+            for i, future in pending.items():
+                result = None
+                if future.done() and not future.cancelled():
+                    # like for synchronous autocompleters, exceptions are passed on to the caller
+                    if future.exception() is None:
+                        result = future.result()
+                    elif error is None:
+                        error = future.exception()
+                else:
+                    future.cancel()
+                completions[i] = (completions[i][0], result)
+            if loop is not None:
+                loop.call_soon_threadsafe(loop.stop)
+        if error is not None:
+            raise error
+
+    @staticmethod
+    async def awaitAutocompletion(awaitable) -> List[Autocompletion] or None:
+        return await awaitable
+
+    @staticmethod
+    def startEventLoop() -> asyncio.AbstractEventLoop:
+        loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_forever()
+            finally:
+                # cancel the tasks which did not finish in time
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                loop.close()
+
+        threading.Thread(target=run, name="Autocompletion", daemon=True).start()
+        return loop
+
+    def getExpectations(self, pos: int) -> List[Autocompletion] or None:
+        """
+        Returns what was expected at the given position of the input, as the autocompletions which would be
+        offered if the input ended there. They are derived from the sequences which failed at that position
+        during the last parse, so the input does not need to be parsed again. Returns None if the given
+        position is not where the last parse failed furthest.
+        """
+        if pos != self._furthestFailurePos:
+            return None
+        endOfInput: Dict[Tuple, SymbolSequence] = {}
+        endOfInputMatcher = Matcher(ParsingState.END_OF_INPUT, pos, "")
+        for seq in self._furthestFailures:
+            if seq.getCurrentSymbol() == BNF.ARTIFICIAL_STOP_SYMBOL:
+                continue
+            key = RDParser.getFrontierKey(seq)
+            if key not in endOfInput:
+                endOfInput[key] = seq.withLastMatcher(endOfInputMatcher)
+        expectations: List[Autocompletion] = []
+        lexer = self._lexer
+        self._lexer = Lexer(lexer.substring(0, pos))
+        try:
+            self._parseContext.run(self.collectAutocompletions, list(endOfInput.values()), expectations)
+        finally:
+            self._lexer = lexer
+        return expectations
+
+    @staticmethod
+    def getFrontierKey(symbolSequence: SymbolSequence) -> Tuple:
+        """
+        Identifies the derivation of the current symbol of the given sequence: the productions of all its
+        ancestors, together with the input positions at which they start. Sequences which only differ
+        in how other parts of the input were parsed have the same key, and yield the same autocompletions.
+        This only walks the chain of replacements, without creating parsed nodes.
+        """
+        key = []
+        idx = symbolSequence.pos
+        child = symbolSequence
+        parent = child.parent
+        while parent is not None:
+            start = parent.pos
+            n = child.nReplacements
+            if idx >= start + n:
+                idx -= n - 1
+            elif idx >= start:
+                # the symbol at idx was created by this replacement
+                idx = start
+                if start == 0:
+                    begin = 0
+                else:
+                    previous = parent.parsedMatchers[start - 1]
+                    begin = previous.pos + len(previous.parsed)
+                key.append(child.production)
+                key.append(begin)
+            child = parent
+            parent = child.parent
+        return tuple(key)
 
     def collectAutocompletingParents(self, symbolSequence: SymbolSequence, autocompletingParents: List[DefaultParsedNode]):
         last: List[DefaultParsedNode or None] = [None]
@@ -103,78 +297,160 @@ class RDParser:
         if autocompletingParent is not None:
             autocompletingParents.append(autocompletingParent)
 
-    def addAutocompletions(self, autocompletingParent: DefaultParsedNode, autocompletions: List[Autocompletion or None]) -> bool:
+    def addAutocompletions(self,
+                           autocompletingParent: DefaultParsedNode,
+                           completion: List[Autocompletion] or None,
+                           autocompletions: List[Autocompletion or None],
+                           seen: Set[str] = None) -> bool:
+        """
+        Adds the given completions to autocompletions, skipping those whose menu string is in seen
+        (the menu strings of autocompletions, if not given). Returns True if one of them is a Veto.
+        """
+        if seen is None:
+            seen = set(map(lambda x: x.getCompletion(Purpose.FOR_MENU), autocompletions))
         autocompletingParentStart = autocompletingParent.matcher.pos
         alreadyEntered = self._lexer.substring(autocompletingParentStart)
-        completion: List[Autocompletion] = autocompletingParent.getAutocompletion(False)
         if completion is not None:
             for c in completion:
                 if c is None or c.isEmptyLiteral():
                     continue
                 if isinstance(c, Veto):
                     autocompletions.clear()
+                    seen.clear()
                     return True
                 c.setAlreadyEnteredText(alreadyEntered)
                 ccomp = c.getCompletion(Purpose.FOR_MENU)
-                if not any(map(lambda x: x.getCompletion(Purpose.FOR_MENU) == ccomp, autocompletions)):
+                if ccomp not in seen:
+                    seen.add(ccomp)
                     autocompletions.append(c)
-
-    def parseRecursive(self, symbolSequence: SymbolSequence, endOfInput: List[SymbolSequence]) -> SymbolSequence:
-        # print("parseRecursive:")
-        # print("  symbol sequence = " + str(symbolSequence))
-        # print("  lexer           = " + str(self._lexer))
-        nextS = symbolSequence.getCurrentSymbol()
-        # print("next = " + str(nextS))
-        while nextS.isTerminal():
-            # print("next is a terminal node, lexer pos = " + str(self._lexer.pos))
-            # if nextS.symbol == "385nm":
-            #     print("debug")
-            matcher = cast(Terminal, nextS).matches(self._lexer)
-            # print("matcher = " + str(matcher))
-            symbolSequence.addMatcher(matcher)
-            if matcher.state == ParsingState.END_OF_INPUT and endOfInput is not None:
-                endOfInput.append(symbolSequence)
-
-            if matcher.state != ParsingState.SUCCESSFUL:
-                return symbolSequence
-
-            symbolSequence.incrementPosition()
-            self._lexer.fwd(len(matcher.parsed))
-            if self._lexer.isDone():
-                return symbolSequence
-            nextS = symbolSequence.getCurrentSymbol()
-
-        u = cast(NonTerminal, nextS)
-        alternatives = self._grammar.getProductions(u)
+        return False
+
+    def parseBacktracking(self, symbolSequence: SymbolSequence, endOfInput: Dict[Tuple, SymbolSequence] or None) -> SymbolSequence or None:
+        """
+        Parses the given sequence depth-first, trying the alternatives of each non-terminal in order, and
+        backtracking to the next one only if the remaining input cannot be parsed. The points to backtrack to
+        are kept on a stack instead of the call stack, so that e.g. long repetitions, which may stop after
+        each entry, do not exceed the recursion limit.
+        Returns the first sequence which was parsed successfully, or otherwise the one which got furthest.
+        """
+        # (sequence whose current symbol has several alternatives, the alternatives, the next one to try, lexer position)
+        choicePoints: List[List] = []
         best = None
         lexerPosOfBest = self._lexer.pos
-        for alternate in alternatives:
-            lexerPos = self._lexer.pos
-            nextSequence = symbolSequence.replaceCurrentSymbol(alternate)
-            parsedSequence = self.parseRecursive(nextSequence, endOfInput)
-            m = parsedSequence.getLastMatcher()
-            if m is not None:
+        while True:
+            parsedSequence, alternatives = self.parseUntilChoice(symbolSequence, endOfInput)
+            if alternatives is not None:
+                choicePoints.append([parsedSequence, alternatives, 0, self._lexer.pos])
+            else:
+                m = parsedSequence.getLastMatcher()
                 if m.state == ParsingState.SUCCESSFUL:
                     return parsedSequence
                 if best is None or m.isBetterThan(best.getLastMatcher()):
                     best = parsedSequence
                     lexerPosOfBest = self._lexer.pos
-            # print("reset lexer pos to " + str(lexerPos))
-            self._lexer.pos = lexerPos
+
+            while len(choicePoints) > 0 and choicePoints[-1][2] == len(choicePoints[-1][1]):
+                choicePoints.pop()
+            if len(choicePoints) == 0:
+                break
+            choicePoint = choicePoints[-1]
+            production, rhs, isContinuation = choicePoint[1][choicePoint[2]]
+            choicePoint[2] += 1
+            # print("reset lexer pos to " + str(choicePoint[3]))
+            self._lexer.pos = choicePoint[3]
+            symbolSequence = choicePoint[0].replaceCurrentSymbol(production, rhs, isContinuation)
 
         if best is not None:
             self._lexer.pos = lexerPosOfBest
 
         return best
 
+    def parseUntilChoice(self, symbolSequence: SymbolSequence, endOfInput: Dict[Tuple, SymbolSequence] or None) \
+            -> Tuple[SymbolSequence, List[Tuple[Production, List[Symbol], bool]] or None]:
+        """
+        Parses the given sequence until either a terminal does not match successfully (or the input is done), or
+        a non-terminal with several alternatives is reached. In the latter case, the alternatives are returned
+        together with the sequence, otherwise None.
+        """
+        # print("parseUntilChoice:")
+        # print("  symbol sequence = " + str(symbolSequence))
+        # print("  lexer           = " + str(self._lexer))
+        while True:
+            nextS = symbolSequence.getCurrentSymbol()
+            # print("next = " + str(nextS))
+            while nextS.isTerminal():
+                # print("next is a terminal node, lexer pos = " + str(self._lexer.pos))
+                # terminals only depend on the input at the lexer position, so their matchers can be reused
+                key = (id(nextS), self._lexer.pos)
+                matcher = self._matcherCache.get(key)
+                if matcher is None:
+                    matcher = cast(Terminal, nextS).matches(self._lexer)
+                    self._matcherCache[key] = matcher
+                # print("matcher = " + str(matcher))
+                symbolSequence.addMatcher(matcher)
+                if matcher.state == ParsingState.END_OF_INPUT and endOfInput is not None:
+                    # different backtracking paths often arrive at the same frontier, only keep the first one
+                    frontierKey = RDParser.getFrontierKey(symbolSequence)
+                    if frontierKey not in endOfInput:
+                        endOfInput[frontierKey] = symbolSequence
+
+                if matcher.state != ParsingState.SUCCESSFUL:
+                    if matcher.state == ParsingState.FAILED and matcher.pos >= self._furthestFailurePos:
+                        if matcher.pos > self._furthestFailurePos:
+                            self._furthestFailurePos = matcher.pos
+                            self._furthestFailures = []
+                        self._furthestFailures.append(symbolSequence)
+                    return symbolSequence, None
+
+                symbolSequence.incrementPosition()
+                self._lexer.fwd(len(matcher.parsed))
+                if self._lexer.isDone():
+                    return symbolSequence, None
+                nextS = symbolSequence.getCurrentSymbol()
+
+            u = cast(NonTerminal, nextS)
+            alternatives = self.getAlternatives(u)
+            if len(alternatives) != 1:
+                return symbolSequence, alternatives
+            # without alternatives there is nothing to backtrack to, so just continue
+            production, rhs, isContinuation = alternatives[0]
+            symbolSequence = symbolSequence.replaceCurrentSymbol(production, rhs, isContinuation)
+
+    def getAlternatives(self, u: NonTerminal) -> List[Tuple[Production, List[Symbol], bool]]:
+        """
+        Returns the ways to replace u, as tuples of the production, the symbols to replace u with,
+        and whether the replacement continues a repetition.
+        """
+        alternatives = self._alternatives.get(id(u))
+        if alternatives is not None:
+            return alternatives
+
+        if isinstance(u, RepetitionContinuation):
+            repetition = u.repetition
+            alternatives = [(repetition, rhs, True) for rhs in repetition.getExpansions(u.count)]
+        else:
+            alternatives = []
+            for alternate in self._grammar.getProductionsOf(u.symbol):
+                if isinstance(alternate, Repetition):
+                    for rhs in alternate.getExpansions(0):
+                        alternatives.append((alternate, rhs, False))
+                else:
+                    alternatives.append((alternate, alternate.right, False))
+        self._alternatives[id(u)] = alternatives
+        return alternatives
+
     def createParsedTree(self,
                          leafSequence: SymbolSequence,
                          retLast: List[DefaultParsedNode] or List[None]) -> DefaultParsedNode:
         parsedNodeSequence = []
         nParsedMatchers = len(leafSequence.parsedMatchers)
         for i, symbol in enumerate(leafSequence.sequence):
+            # the unparsed remainder of a repetition does not contribute any children
+            if isinstance(symbol, RepetitionContinuation):
+                parsedNodeSequence.append([])
+                continue
             # TODO maybe this should not be 0:
-            matcher = leafSequence.parsedMatchers[i] if i < nParsedMatchers else Matcher(ParsingState.NOT_PARSED, 0, "")
+            matcher = leafSequence.parsedMatchers[i] if i < nParsedMatchers else NOT_PARSED_MATCHER
             pn = self._parsedNodeFactory.createNode(matcher, symbol, None)
             parsedNodeSequence.append(pn)
 
@@ -186,33 +462,66 @@ class RDParser:
             parentSequence = childSequence.parent
             productionToCreateChildSequence = childSequence.production
             pos = parentSequence.pos
-            rhs = productionToCreateChildSequence.right
             lhs = productionToCreateChildSequence.left
-            rhsSize = len(rhs)
+            rhsSize = childSequence.nReplacements
             childList = parsedNodeSequence[pos:pos + rhsSize]
 
-            matcher = matcherFromChildSequence(childList)
-            newParent = self._parsedNodeFactory.createNode(matcher, lhs, productionToCreateChildSequence)
-            newParent.addChildren(childList)
+            if isinstance(productionToCreateChildSequence, Repetition):
+                # The entries of a repetition are collected in a flat list (in reverse order, so that
+                # each continuation only needs to append its own entries), which is the last element
+                # of the replaced symbols.
+                if rhsSize > 0:
+                    entries = childList[-1]
+                    entries.extend(reversed(childList[:-1]))
+                else:
+                    entries = []
+                if childSequence.isContinuation:
+                    newParent = entries
+                else:
+                    entries.reverse()
+                    newParent = self._parsedNodeFactory.createNode(matcherFromChildSequence(entries), lhs, productionToCreateChildSequence)
+                    newParent.addChildren(entries)
+                    productionToCreateChildSequence.wasExtended(newParent, entries)
+            else:
+                matcher = matcherFromChildSequence(childList)
+                newParent = self._parsedNodeFactory.createNode(matcher, lhs, productionToCreateChildSequence)
+                newParent.addChildren(childList)
+                productionToCreateChildSequence.wasExtended(newParent, childList)
             del(parsedNodeSequence[pos:pos + rhsSize])
             parsedNodeSequence.insert(pos, newParent)
 
             childSequence = childSequence.parent
 
-        root = parsedNodeSequence[0]
-        notifyExtensionListeners(root)
-        return root
+        return parsedNodeSequence[0]
+
 
+# matchers are immutable, so unparsed leaves can all share one
+NOT_PARSED_MATCHER = Matcher(ParsingState.NOT_PARSED, 0, "")
 
-def notifyExtensionListeners(pn: DefaultParsedNode) -> None:
-    production = pn.production
-    if production is not None:
-        production.wasExtended(pn, pn.children)
-        for child in pn.children:
-            notifyExtensionListeners(child)
+
+@contextmanager
+def gcSuspended(suspend: bool = True):
+    """
+    Disables the cyclic garbage collector (if suspend is True and it is enabled) for the duration of the block.
+    """
+    reenable = suspend and gc.isenabled()
+    if reenable:
+        gc.disable()
+    try:
+        yield
+    finally:
+        if reenable:
+            gc.enable()
 
 
 def matcherFromChildSequence(children: List[DefaultParsedNode]) -> Matcher:
+    if len(children) == 0:
+        return NOT_PARSED_MATCHER
+    if len(children) == 1:
+        # a single parsed child spans exactly what its parent spans
+        matcher = children[0].matcher
+        if matcher.state != ParsingState.NOT_PARSED:
+            return matcher
     pos = -1
     state = ParsingState.NOT_PARSED
     parsed = ""
@@ -235,6 +544,7 @@ def matcherFromChildSequence(children: List[DefaultParsedNode]) -> Matcher:
 
 
 class SymbolSequence:
+    __slots__ = ("_sequence", "_pos", "_parent", "_production", "_parsedMatchers", "_nReplacements", "_isContinuation")
 
     def __init__(self, start: Symbol or None):
         self._sequence = [start] if start is not None else []
@@ -242,6 +552,8 @@ class SymbolSequence:
         self._parent = None
         self._production = None
         self._parsedMatchers = []
+        self._nReplacements = 1
+        self._isContinuation = False
 
     def getLastMatcher(self) -> Matcher:
         return self._parsedMatchers[-1]
@@ -252,17 +564,31 @@ class SymbolSequence:
     def getCurrentSymbol(self) -> Symbol:
         return self._sequence[self._pos]
 
-    def replaceCurrentSymbol(self, production: Production) -> SymbolSequence:
+    def replaceCurrentSymbol(self, production: Production, replacements: List[Symbol] = None, isContinuation: bool = False) -> SymbolSequence:
+        if replacements is None:
+            replacements = production.right
         copy = SymbolSequence(None)
-        copy._sequence = self._sequence.copy()
+        copy._sequence = self._sequence[:self._pos] + replacements + self._sequence[self._pos + 1:]
         copy._pos = self._pos
         copy._parent = self
         copy._production = production
         copy._parsedMatchers = self._parsedMatchers.copy()
-        copy._sequence.pop(self._pos)
-        replacements = production.right.copy()
-        for idx, replacement in enumerate(replacements):
-            copy._sequence.insert(self._pos + idx, replacement)
+        copy._nReplacements = len(replacements)
+        copy._isContinuation = isContinuation
+        return copy
+
+    def withLastMatcher(self, matcher: Matcher) -> SymbolSequence:
+        """
+        Returns a copy of this sequence, in which the last parsed matcher is replaced by the given one.
+        """
+        copy = SymbolSequence(None)
+        copy._sequence = self._sequence
+        copy._pos = self._pos
+        copy._parent = self._parent
+        copy._production = self._production
+        copy._parsedMatchers = self._parsedMatchers[:-1] + [matcher]
+        copy._nReplacements = self._nReplacements
+        copy._isContinuation = self._isContinuation
         return copy
 
     def incrementPosition(self) -> None:
@@ -295,3 +621,11 @@ class SymbolSequence:
     @property
     def pos(self):
         return self._pos
+
+    @property
+    def nReplacements(self) -> int:
+        return self._nReplacements
+
+    @property
+    def isContinuation(self) -> bool:
+        return self._isContinuation
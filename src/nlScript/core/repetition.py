@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from typing import Dict, List, TYPE_CHECKING
+
+from nlScript.core.nonterminal import NonTerminal
+from nlScript.core.production import Production
+
+if TYPE_CHECKING:
+    from nlScript.core.defaultparsednode import DefaultParsedNode
+    from nlScript.core.symbol import Symbol
+
+
+class Repetition(Production):
+    """
+    A production of the form
+
+        left -> entry (delimiter entry)*
+
+    with at least `lower` and at most `upper` entries. Instead of being expanded
+    into recursive helper productions, it is expanded lazily by the RDParser,
+    one entry at a time, and results in a single parsed node which holds all
+    entries (and delimiters) as direct children.
+    """
+    def __init__(self, left: Symbol, entry: Symbol, delimiter: Symbol or None, lower: int, upper: int):
+        super().__init__(left, [entry] if delimiter is None else [entry, delimiter])
+        self._entry = entry
+        self._delimiter = delimiter
+        self._lower = lower
+        self._upper = upper
+        # keyed by the entry count; filled lazily with setdefault(), so that concurrent
+        # parsers which create the same entry at the same time all end up using the first one
+        self._continuations: Dict[int, RepetitionContinuation] = {}
+        self._expansions: Dict[int, List[List[Symbol]]] = {}
+
+    @property
+    def entry(self) -> Symbol:
+        return self._entry
+
+    @property
+    def delimiter(self) -> Symbol or None:
+        return self._delimiter
+
+    @property
+    def lower(self) -> int:
+        return self._lower
+
+    @property
+    def upper(self) -> int:
+        return self._upper
+
+    def getContinuation(self, count: int) -> RepetitionContinuation:
+        continuation = self._continuations.get(count)
+        if continuation is None:
+            continuation = self._continuations.setdefault(count, RepetitionContinuation(self, count))
+        return continuation
+
+    def getExpansions(self, count: int) -> List[List[Symbol]]:
+        """
+        Returns the alternatives for continuing the repetition after `count` entries,
+        in the order in which they should be tried: first another entry (greedy),
+        then stopping.
+        """
+        expansions = self._expansions.get(count)
+        if expansions is None:
+            expansions = self._expansions.setdefault(count, self.createExpansions(count))
+        return expansions
+
+    def createExpansions(self, count: int) -> List[List[Symbol]]:
+        alternatives = []
+        if count < self._upper:
+            rhs = [self._entry, self.getContinuation(count + 1)]
+            if count > 0 and self._delimiter is not None:
+                rhs.insert(0, self._delimiter)
+            alternatives.append(rhs)
+        if count >= self._lower:
+            alternatives.append([])
+        return alternatives
+
+    def isDelimiter(self, idx: int) -> bool:
+        """
+        Returns whether the `idx`-th child of a parsed repetition node is a delimiter.
+        """
+        return self._delimiter is not None and idx % 2 == 1
+
+    def getEntries(self, children: List[DefaultParsedNode]) -> List[DefaultParsedNode]:
+        return children if self._delimiter is None else children[0::2]
+
+    def __str__(self) -> str:
+        left = str(self.left)
+        rhs = str(self._entry)
+        if self._delimiter is not None:
+            rhs += " (" + str(self._delimiter) + " " + str(self._entry) + ")"
+        return (50 - len(left)) * " " + left + " -> " + rhs + "{" + str(self._lower) + "," + str(self._upper) + "}"
+
+    def __eq__(self, other: Production) -> bool:
+        if type(self) != type(other):
+            return False
+        return self.left == other.left and \
+            self._entry == other.entry and \
+            self._delimiter == other.delimiter and \
+            self._lower == other.lower and \
+            self._upper == other.upper
+
+    def __hash__(self) -> object:
+        return super().__hash__() + 31 * (31 * self._lower + self._upper)
+
+
+class RepetitionContinuation(NonTerminal):
+    """
+    Placeholder for the remainder of a Repetition after `count` entries.
+    It is only created by the RDParser and never appears in a grammar.
+    """
+    def __init__(self, repetition: Repetition, count: int):
+        super().__init__(repetition.left.symbol + ":" + str(count))
+        self._repetition = repetition
+        self._count = count
+
+    @property
+    def repetition(self) -> Repetition:
+        return self._repetition
+
+    @property
+    def count(self) -> int:
+        return self._count
@@ -13,6 +13,15 @@ class Symbol(RepresentsSymbol):
     def symbol(self) -> str:
         return self._symbol
 
+    def intern(self, symbol: str) -> None:
+        """
+        Replaces the name of this symbol by the given equal string, which is shared by the symbols of a grammar
+        (see BNF.intern()), so that comparing symbols with equal names does not need to compare their characters.
+        """
+        if symbol != self._symbol:
+            raise Exception("Cannot rename symbol " + self._symbol + " to " + symbol)
+        self._symbol = symbol
+
     # overriding abstract method
     def getRepresentedSymbol(self) -> Symbol:
         return self
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import weakref
 from abc import abstractmethod
 from collections import Counter
 
@@ -278,12 +279,24 @@ WHITESPACE = Whitespace()
 END_OF_INPUT = EndOfInput()
 
 
+# Terminals are immutable, so literal() and characterClass() return one shared instance per literal/pattern,
+# as long as it is used by some grammar
+LITERALS: weakref.WeakValueDictionary[str, Literal] = weakref.WeakValueDictionary()
+CHARACTER_CLASSES: weakref.WeakValueDictionary[str, CharacterClass] = weakref.WeakValueDictionary()
+
+
 def literal(s: str) -> Literal:
-    return Literal(s)
+    ret = LITERALS.get(s)
+    if ret is None:
+        ret = LITERALS.setdefault(s, Literal(s))
+    return ret
 
 
 def characterClass(pattern: str) -> CharacterClass:
-    return CharacterClass(pattern)
+    ret = CHARACTER_CLASSES.get(pattern)
+    if ret is None:
+        ret = CHARACTER_CLASSES.setdefault(pattern, CharacterClass(pattern))
+    return ret
 
 
 if __name__ == "__main__":
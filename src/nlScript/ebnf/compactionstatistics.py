@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+
+class CompactionStatistics:
+    """
+    Sizes of a grammar before and after EBNFCore.compact().
+    """
+    def __init__(self,
+                 rulesBefore: int, rulesAfter: int,
+                 productionsBefore: int, productionsAfter: int,
+                 symbolsBefore: int, symbolsAfter: int):
+        self._rulesBefore = rulesBefore
+        self._rulesAfter = rulesAfter
+        self._productionsBefore = productionsBefore
+        self._productionsAfter = productionsAfter
+        self._symbolsBefore = symbolsBefore
+        self._symbolsAfter = symbolsAfter
+
+    @property
+    def rulesBefore(self) -> int:
+        return self._rulesBefore
+
+    @property
+    def rulesAfter(self) -> int:
+        return self._rulesAfter
+
+    @property
+    def productionsBefore(self) -> int:
+        return self._productionsBefore
+
+    @property
+    def productionsAfter(self) -> int:
+        return self._productionsAfter
+
+    @property
+    def symbolsBefore(self) -> int:
+        return self._symbolsBefore
+
+    @property
+    def symbolsAfter(self) -> int:
+        return self._symbolsAfter
+
+    def getRemovedRules(self) -> int:
+        return self._rulesBefore - self._rulesAfter
+
+    def __str__(self) -> str:
+        return "rules: " + str(self._rulesBefore) + " -> " + str(self._rulesAfter) + ", " + \
+               "productions: " + str(self._productionsBefore) + " -> " + str(self._productionsAfter) + ", " + \
+               "symbols: " + str(self._symbolsBefore) + " -> " + str(self._symbolsAfter)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable, Dict
 
 from nlScript.autocompleter import DEFAULT_INLINE_AUTOCOMPLETER, \
     EntireSequenceAutocompleter, PATH_AUTOCOMPLETER, Autocompleter
@@ -13,6 +13,7 @@ from nlScript.evaluator import Evaluator, DEFAULT_EVALUATOR
 from nlScript.util.range import Range
 
 if TYPE_CHECKING:
+    from nlScript.core.symbol import Symbol
     from nlScript.ebnf.rule import Rule
     from nlScript.parsednode import ParsedNode
 
@@ -34,24 +35,91 @@ class EBNF(EBNFCore):
     DATETIME_NAME = "date-time"
     COLOR_NAME = "color"
 
-    def __init__(self, other: EBNF = None):
-        super().__init__(other)
-        self.SIGN            = self.makeSign()           if other is None else other.SIGN
-        self.INTEGER         = self.makeInteger()        if other is None else other.INTEGER
-        self.FLOAT           = self.makeFloat()          if other is None else other.FLOAT
-        self.MONTH           = self.makeMonth()          if other is None else other.MONTH
-        self.WEEKDAY         = self.makeWeekday()        if other is None else other.WEEKDAY
-        self.WHITESPACE_STAR = self.makeWhitespaceStar() if other is None else other.WHITESPACE_STAR
-        self.WHITESPACE_PLUS = self.makeWhitespacePlus() if other is None else other.WHITESPACE_PLUS
-        self.INTEGER_RANGE   = self.makeIntegerRange()   if other is None else other.INTEGER_RANGE
-        self.PATH            = self.makePath()           if other is None else other.PATH
-        self.TIME            = self.makeTime()           if other is None else other.TIME
-        self.DATE            = self.makeDate()           if other is None else other.DATE
-        self.DATETIME        = self.makeDatetime()       if other is None else other.DATETIME
-        self.COLOR           = self.makeColor()          if other is None else other.COLOR
+    def __init__(self, other: EBNF = None, parent: EBNF = None):
+        super().__init__(other, parent)
+        # builtin types are only created when they are first referenced, see getBuiltin();
+        # a derived grammar uses those already created by its parent
+        base = other if other is not None else parent
+        self._builtins: Dict[str, Rule or None] = {} if base is None else \
+            {name: rule for name, rule in base._builtins.items() if rule is not None}
         super().symbols[self.DIGIT_NAME] = terminal.DIGIT
         super().symbols[self.LETTER_NAME] = terminal.LETTER
 
+    @property
+    def SIGN(self) -> Rule:
+        return self.getBuiltin(EBNF.SIGN_NAME)
+
+    @property
+    def INTEGER(self) -> Rule:
+        return self.getBuiltin(EBNF.INTEGER_NAME)
+
+    @property
+    def FLOAT(self) -> Rule:
+        return self.getBuiltin(EBNF.FLOAT_NAME)
+
+    @property
+    def MONTH(self) -> Rule:
+        return self.getBuiltin(EBNF.MONTH_NAME)
+
+    @property
+    def WEEKDAY(self) -> Rule:
+        return self.getBuiltin(EBNF.WEEKDAY_NAME)
+
+    @property
+    def WHITESPACE_STAR(self) -> Rule:
+        return self.getBuiltin(EBNF.WHITESPACE_STAR_NAME)
+
+    @property
+    def WHITESPACE_PLUS(self) -> Rule:
+        return self.getBuiltin(EBNF.WHITESPACE_PLUS_NAME)
+
+    @property
+    def INTEGER_RANGE(self) -> Rule:
+        return self.getBuiltin(EBNF.INTEGER_RANGE_NAME)
+
+    @property
+    def PATH(self) -> Rule:
+        return self.getBuiltin(EBNF.PATH_NAME)
+
+    @property
+    def TIME(self) -> Rule:
+        return self.getBuiltin(EBNF.TIME_NAME)
+
+    @property
+    def DATE(self) -> Rule:
+        return self.getBuiltin(EBNF.DATE_NAME)
+
+    @property
+    def DATETIME(self) -> Rule:
+        return self.getBuiltin(EBNF.DATETIME_NAME)
+
+    @property
+    def COLOR(self) -> Rule:
+        return self.getBuiltin(EBNF.COLOR_NAME)
+
+    def getBuiltin(self, name: str) -> Rule:
+        """
+        Returns the rule of the builtin type with the given name, creating it on first access.
+        """
+        rule = self._builtins.get(name)
+        if rule is None:
+            if name in self._builtins:
+                raise Exception("Builtin type " + name + " is referenced while it is being created")
+            # mark as being created, so that getSymbol() does not try to create it again
+            self._builtins[name] = None
+            try:
+                rule = EBNF.BUILTINS[name](self)
+            except BaseException:
+                del self._builtins[name]
+                raise
+            self._builtins[name] = rule
+        return rule
+
+    def getSymbol(self, typ: str) -> Symbol or None:
+        if typ in EBNF.BUILTINS and typ not in self._builtins and not self.isFrozen():
+            self.getBuiltin(typ)
+        return super().getSymbol(typ)
+
     @staticmethod
     def clearFilesystemCache():
         PATH_AUTOCOMPLETER.clearFilesystemCache()
@@ -112,12 +180,12 @@ class EBNF(EBNFCore):
 
     def makeWhitespaceStar(self) -> Rule:
         ret = self.star(EBNF.WHITESPACE_STAR_NAME, terminal.WHITESPACE.withName())
-        ret.setAutocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [" "] if len(pn.getParsedString()) == 0 else [""]))
+        ret.setAutocompleter(Autocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [" "] if len(pn.getParsedString()) == 0 else [""]), grammarOnly=True))
         return ret
 
     def makeWhitespacePlus(self) -> Rule:
         ret = self.plus(EBNF.WHITESPACE_PLUS_NAME, terminal.WHITESPACE.withName())
-        ret.setAutocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [" "] if len(pn.getParsedString()) == 0 else [""]))
+        ret.setAutocompleter(Autocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [" "] if len(pn.getParsedString()) == 0 else [""]), grammarOnly=True))
         return ret
 
     def makeIntegerRange(self) -> Rule:
@@ -273,3 +341,19 @@ class EBNF(EBNFCore):
         path.setEvaluator(lambda pn: pn.evaluateChildByNames("path"))
         path.setAutocompleter(EntireSequenceAutocompleter(self, {}))
         return path
+
+    BUILTINS: Dict[str, Callable[[EBNF], Rule]] = {
+        SIGN_NAME:            makeSign,
+        INTEGER_NAME:         makeInteger,
+        FLOAT_NAME:           makeFloat,
+        MONTH_NAME:           makeMonth,
+        WEEKDAY_NAME:         makeWeekday,
+        WHITESPACE_STAR_NAME: makeWhitespaceStar,
+        WHITESPACE_PLUS_NAME: makeWhitespacePlus,
+        INTEGER_RANGE_NAME:   makeIntegerRange,
+        PATH_NAME:            makePath,
+        TIME_NAME:            makeTime,
+        DATE_NAME:            makeDate,
+        DATETIME_NAME:        makeDatetime,
+        COLOR_NAME:           makeColor
+    }
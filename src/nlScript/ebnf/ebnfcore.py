@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+from nlScript.autocompleter import Autocompleter
 from nlScript.core.autocompletion import Autocompletion, EntireSequence
 from nlScript.core.terminal import WHITESPACE, literal
+from nlScript.ebnf.compactionstatistics import CompactionStatistics
 from nlScript.ebnf.join import Join
 from nlScript.ebnf.optional import Optional
 from nlScript.ebnf.orrule import Or
-from typing import TYPE_CHECKING, List, cast, Dict, Set
+from typing import TYPE_CHECKING, List, cast, Dict, Set, Callable, Tuple
 
 from nlScript.core.bnf import BNF
 from nlScript.ebnf.plus import Plus
 from nlScript.ebnf.repeat import Repeat
+from nlScript.ebnf.rule import Rule
 from nlScript.ebnf.sequence import Sequence
 from nlScript.ebnf.star import Star
 from nlScript.evaluator import FIRST_CHILD_EVALUATOR
@@ -18,46 +21,159 @@ from nlScript.util.range import Range, STAR
 
 if TYPE_CHECKING:
     from nlScript.core.symbol import Symbol
-    from nlScript.ebnf.rule import Rule
     from nlScript.core.named import Named
     from nlScript.parsednode import ParsedNode
     from nlScript.core.production import Production
 
 
 class EBNFCore:
-    def __init__(self, other: EBNFCore = None):
+    def __init__(self, other: EBNFCore = None, parent: EBNFCore = None):
+        if other is not None:
+            parent = other._parent
+        if parent is not None and not parent.isFrozen():
+            raise Exception("The parent of a layered grammar must be frozen")
+        # the frozen grammar below this one, see derive(); only rules added or removed in this layer are stored here
+        self._parent: EBNFCore or None = parent
         self._symbols: {str, Symbol} = {} if other is None else other.symbols.copy()
-        self._rules   = [] if other is None else other.rules.copy()
-        self._bnf = BNF()
+        # used as an insertion-ordered set
+        self._rules: Dict[Rule, None] = {} if other is None else other._rules.copy()
+        # rules indexed by the symbol of their target, in insertion order; in a layer, the
+        # complete list of a symbol is copied from the parent when it is first changed
+        self._rulesByTarget: Dict[str, List[Rule]] = {} if other is None else \
+            {tgt: rules.copy() for tgt, rules in other._rulesByTarget.items()}
+        # rules of the parent which are hidden in this layer
+        self._removedRules: Dict[Rule, None] = {} if other is None else other._removedRules.copy()
+        if other is not None:
+            self._bnf = other._bnf.copy()
+        else:
+            self._bnf = BNF() if parent is None else parent._bnf.derive()
+        # anonymous rules shared between structurally identical uses, see getOrCreateRule()
+        self._sharedRules: Dict[Tuple, Rule] = {} if other is None else other._sharedRules.copy()
+        self._frozen = False
+        # incremented whenever rules are added or removed
+        self._modCount = 0
+        self._rulesWithListeners: Set[Rule] or None = None
+        self._listenerModCount = -1
+        # change log: symbols whose rules, or whose referencing productions, changed since the last compact()
+        self._changedSymbols: Dict[str, None] = {} if other is None else other._changedSymbols.copy()
 
     def copy(self):
         return EBNFCore(other=self)
 
+    def derive(self) -> EBNFCore:
+        """
+        Returns a new grammar layered on top of this one, which initially has the same rules, without copying them.
+        Rules added to or removed from the new grammar only affect the new grammar. This grammar is frozen,
+        because its rules are shared with the new grammar; the cost of deriving is independent of its size.
+        """
+        self.freeze()
+        return type(self)(parent=self)
+
+    def getParent(self) -> EBNFCore or None:
+        return self._parent
+
+    def freeze(self) -> None:
+        """
+        Makes this grammar immutable, so that it can be shared, e.g. between threads or by derived grammars.
+        Adding or removing rules afterwards raises an exception; copies are not frozen.
+        """
+        self._frozen = True
+
+    def isFrozen(self) -> bool:
+        return self._frozen
+
+    def getModCount(self) -> int:
+        """
+        Returns a counter which changes whenever rules are added to or removed from this grammar.
+        """
+        return self._modCount
+
     def getSymbol(self, typ: str) -> Symbol or None:
         if typ in self._symbols:
             return self._symbols[typ]
+        if self._parent is not None:
+            return self._parent.getSymbol(typ)
         return None
 
     def compile(self, topLevelSymbol: Symbol) -> None:
-        # update the start symbol
-        self.removeRules(BNF.ARTIFICIAL_START_SYMBOL)
-        sequence = Sequence(BNF.ARTIFICIAL_START_SYMBOL, [topLevelSymbol, BNF.ARTIFICIAL_STOP_SYMBOL])
-        self.addRule(sequence)
-        sequence.setEvaluator(FIRST_CHILD_EVALUATOR)
+        # update the start symbol, unless it already derives topLevelSymbol
+        startRules = self.getRulesOf(BNF.ARTIFICIAL_START_SYMBOL.symbol)
+        if not startRules or startRules[-1].children[0] != topLevelSymbol:
+            self.removeRules(BNF.ARTIFICIAL_START_SYMBOL)
+            sequence = Sequence(BNF.ARTIFICIAL_START_SYMBOL, [topLevelSymbol, BNF.ARTIFICIAL_STOP_SYMBOL])
+            self.addRule(sequence)
+            sequence.setEvaluator(FIRST_CHILD_EVALUATOR)
+        self.getRulesWithListeners()
 
     def getBNF(self):
         return self._bnf
 
     @property
     def symbols(self) -> Dict[str, Symbol]:
+        """
+        The symbols of this grammar; for a derived grammar, only those of this layer, see getSymbol().
+        """
         return self._symbols
 
     @property
     def rules(self) -> List[Rule]:
-        return self._rules
+        if self._parent is None:
+            return list(self._rules)
+        return [r for r in self._parent.rules if r not in self._removedRules] + list(self._rules)
+
+    def numRules(self) -> int:
+        n = len(self._rules)
+        if self._parent is not None:
+            n += self._parent.numRules() - len(self._removedRules)
+        return n
+
+    def containsRule(self, rule: Rule) -> bool:
+        if rule in self._rules:
+            return True
+        return self._parent is not None and rule not in self._removedRules and self._parent.containsRule(rule)
 
     def getRules(self, target: NonTerminal) -> List[Rule]:
-        return [r for r in self._rules if r.tgt == target]
+        return self.getRulesOf(target.symbol).copy()
+
+    def getRulesOf(self, symbol: str) -> List[Rule]:
+        """
+        Returns the rules targeting the symbol with the given name; the returned list must not be modified.
+        """
+        rules = self._rulesByTarget.get(symbol)
+        if rules is None:
+            return [] if self._parent is None else self._parent.getRulesOf(symbol)
+        return rules
+
+    def getLayerRules(self, symbol: str) -> List[Rule]:
+        """
+        Returns the modifiable list of rules targeting the given symbol in this layer,
+        copying it from the parent if necessary.
+        """
+        rules = self._rulesByTarget.get(symbol)
+        if rules is None:
+            rules = [] if self._parent is None else self._parent.getRulesOf(symbol).copy()
+            self._rulesByTarget[symbol] = rules
+        return rules
+
+    def getRulesWithListeners(self) -> Set[Rule]:
+        """
+        Returns the rules which have an onSuccessfulParsed listener, so that parsers can skip
+        notifying listeners if there are none. The set is maintained when rules are added or removed,
+        and only rebuilt if a listener was set on any rule.
+        """
+        if self._rulesWithListeners is None or self._listenerModCount != Rule.listenerModCount:
+            self._rulesWithListeners = set() if self._parent is None else \
+                {r for r in self._parent.getRulesWithListeners() if r not in self._removedRules}
+            self._rulesWithListeners.update(r for r in self._rules if r.getOnSuccessfulParsed() is not None)
+            self._listenerModCount = Rule.listenerModCount
+        return self._rulesWithListeners
+
+    def getChangedSymbols(self) -> List[str]:
+        """
+        Returns the symbols whose rules were added or removed, or which lost a reference,
+        since the last call to compact().
+        """
+        return list(self._changedSymbols)
 
     def plus(self, typ: str or None, child: Named) -> Rule:
         tgt = self.newOrExistingNonTerminal(typ)
@@ -153,21 +269,56 @@ class EBNFCore:
         else:
             return self.joinWithRange(typ, child, jopen, jclose, delimiter, cardinality, onlyKeepEntries)
 
+    def getOrCreateRule(self, key: Tuple, create: Callable[[], Rule]) -> Rule:
+        """
+        Hash-consing of anonymous rules: returns the rule previously created for the structural key,
+        if it is still part of this grammar, and otherwise the rule created (and added) by create().
+        The key must identify everything which determines the rule, including its evaluator and
+        autocompleter, and the returned rule must not be modified by the caller.
+        """
+        rule = self.getSharedRule(key)
+        if rule is None or not self.containsRule(rule):
+            rule = create()
+            self._sharedRules[key] = rule
+        return rule
+
+    def getSharedRule(self, key: Tuple) -> Rule or None:
+        rule = self._sharedRules.get(key)
+        if rule is None and self._parent is not None:
+            rule = self._parent.getSharedRule(key)
+        return rule
+
+    def listDelimiter(self) -> Rule:
+        def create() -> Rule:
+            wsStar = self.star(None, WHITESPACE.withName()).withName("ws*")
+            delimiter = self.sequence(None, [
+                                      wsStar,
+                                      literal(",").withName(),
+                                      wsStar])
+            delimiter.setAutocompleter(Autocompleter(
+                lambda pn, justCheck: Autocompletion.literal(pn, [""] if len(pn.getParsedString()) > 0 else [", "]),
+                grammarOnly=True))
+            return delimiter
+        return self.getOrCreateRule(("list-delimiter",), create)
+
     def list(self, typ: str or None, child: Named) -> Rule:
-        wsStar = self.star(None, WHITESPACE.withName()).withName("ws*")
-        delimiter = self.sequence(None, [
-                                  wsStar,
-                                  literal(",").withName(),
-                                  wsStar])
-        delimiter.setAutocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [""] if len(pn.getParsedString()) > 0 else [", "]))
-        return self.joinWithRange(typ, child, None, None, delimiter.tgt, STAR)
+        return self.joinWithRange(typ, child, None, None, self.listDelimiter().tgt, STAR)
+
+    def tupleWhitespace(self) -> Named:
+        def create() -> Rule:
+            wsStar = self.star(None, WHITESPACE.withName())
+            wsStar.setAutocompleter(Autocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [""]), grammarOnly=True))
+            return wsStar
+        return self.getOrCreateRule(("tuple-ws*",), create).withName("ws*")
 
     def tuple(self, typ: str or None, child: Named, names: List[str]) -> Rule:
-        wsStar = self.star(None, WHITESPACE.withName()).withName("ws*")
-        wsStar.get().setAutocompleter(lambda pn, justCheck: Autocompletion.literal(pn, [""]))
-        jopen: Rule = self.sequence(None, [literal("(").withName("open"), wsStar])
-        jclose: Rule = self.sequence(None, [wsStar, literal(")").withName("close")])
-        delimiter: Rule = self.sequence(None, [wsStar, literal(",").withName("delimiter"), wsStar])
+        wsStar = self.tupleWhitespace()
+        jopen: Rule = self.getOrCreateRule(
+            ("tuple-open",), lambda: self.sequence(None, [literal("(").withName("open"), wsStar]))
+        jclose: Rule = self.getOrCreateRule(
+            ("tuple-close",), lambda: self.sequence(None, [wsStar, literal(")").withName("close")]))
+        delimiter: Rule = self.getOrCreateRule(
+            ("tuple-delimiter",), lambda: self.sequence(None, [wsStar, literal(",").withName("delimiter"), wsStar]))
         ret: Rule = self.joinWithNames(typ, child, jopen.tgt, jclose.tgt, delimiter.tgt, names=names)
 
         def getAutocompletion(pn: ParsedNode, justCheck: bool) -> str or None:
@@ -186,7 +337,7 @@ class EBNFCore:
             seq.addLiteral(jclose.tgt, "close", ")")
             return seq.asArray()
 
-        ret.setAutocompleter(getAutocompletion)
+        ret.setAutocompleter(Autocompleter(getAutocompletion, grammarOnly=True))
         return ret
 
     def sequence(self, typ: str or None, children: List[Named]) -> Rule:
@@ -205,21 +356,114 @@ class EBNFCore:
         return list(map(lambda x: x.name, named))
 
     def addRule(self, rule: Rule) -> None:
+        if self._frozen:
+            raise Exception("Cannot add rules to a frozen grammar")
+        rule.nameAnonymousTarget(self._bnf)
         if rule.tgt.symbol not in self._symbols:
             self._symbols[rule.tgt.symbol] = rule.tgt
         for s in rule.children:
             if not s.isEpsilon() and s.symbol not in self._symbols:
                 self._symbols[s.symbol] = s
-        self._rules.append(rule)
+        self._rules[rule] = None
+        self.getLayerRules(rule.tgt.symbol).append(rule)
+        self._changedSymbols[rule.tgt.symbol] = None
+        self._modCount += 1
+        if self._rulesWithListeners is not None and rule.getOnSuccessfulParsed() is not None:
+            self._rulesWithListeners.add(rule)
         rule.createBNF(self._bnf)
 
     def removeRules(self, symbol: NonTerminal):
+        if self._frozen:
+            raise Exception("Cannot remove rules from a frozen grammar")
+        self.removeRulesOf(symbol.symbol)
+
+    def removeRulesOf(self, symbol: str) -> Set[str]:
+        """
+        Removes all rules targeting the given symbol and returns the symbols referenced by their productions.
+        """
+        if self._parent is None:
+            rules = self._rulesByTarget.pop(symbol, [])
+        else:
+            # hide the parent's rules
+            rules = self.getRulesOf(symbol)
+            self._rulesByTarget[symbol] = []
         toRemove: Set[Production] = set([])
-        for i in range(len(self._rules) - 1, -1, -1):
-            if self._rules[i].tgt == symbol:
-                toRemove.update(self._rules[i].productions)
-                del (self._rules[i])
-        self._bnf.removeProductions(toRemove)
+        for rule in rules:
+            toRemove.update(rule.productions)
+            if rule in self._rules:
+                del self._rules[rule]
+            else:
+                self._removedRules[rule] = None
+            if self._rulesWithListeners is not None:
+                self._rulesWithListeners.discard(rule)
+        self._changedSymbols[symbol] = None
+        self._modCount += 1
+        referenced = self._bnf.removeProductions(toRemove)
+        for s in referenced:
+            self._changedSymbols[s] = None
+        return referenced
+
+    def isRemovable(self, symbol: str) -> bool:
+        """
+        Whether the given symbol is only the target of anonymous rules and is not referenced by any production.
+        """
+        rules = self.getRulesOf(symbol)
+        if not rules or not all(r.isAnonymous() for r in rules):
+            return False
+        return not self._bnf.isReferenced(rules[0].tgt)
+
+    def compact(self, full: bool = False) -> CompactionStatistics:
+        """
+        Removes anonymous rules (e.g. the helper rules created for variables in sentence patterns)
+        which are not used anymore, e.g. after removeRules(), together with their productions and symbols.
+
+        By default, only the symbols recorded in the change log since the last compaction are checked
+        (recursively), so the cost is proportional to the changes and not to the grammar size. With
+        full=True, all anonymous rules which cannot be reached from a named rule are removed, which also
+        catches helper rules that only reference each other. In a derived grammar, rules of the parent
+        are hidden rather than removed, and the symbol counts refer to this layer only.
+        """
+        if self._frozen and (full or len(self._changedSymbols) > 0):
+            raise Exception("Cannot compact a frozen grammar")
+        rulesBefore = self.numRules()
+        productionsBefore = self._bnf.numProductions()
+        symbolsBefore = len(self._symbols)
+
+        if full:
+            reachable: Set[str] = set()
+            rules = self.rules
+            stack: List[Symbol] = [r.tgt for r in rules if not r.isAnonymous()]
+            while len(stack) > 0:
+                symbol = stack.pop()
+                if symbol.symbol in reachable:
+                    continue
+                reachable.add(symbol.symbol)
+                for p in self._bnf.getProductionsOf(symbol.symbol):
+                    for s in p.right:
+                        if s.isNonTerminal() and s.symbol not in reachable:
+                            stack.append(s)
+            unreachable = {r.tgt.symbol: None for r in rules if r.isAnonymous() and r.tgt.symbol not in reachable}
+            for symbol in unreachable:
+                self.removeRulesOf(symbol)
+                self._symbols.pop(symbol, None)
+        else:
+            worklist = list(self._changedSymbols)
+            self._changedSymbols.clear()
+            while len(worklist) > 0:
+                symbol = worklist.pop()
+                if self.isRemovable(symbol):
+                    worklist.extend(self.removeRulesOf(symbol))
+                    self._symbols.pop(symbol, None)
+        self._changedSymbols.clear()
+
+        rulesAfter = self.numRules()
+        if rulesAfter < rulesBefore:
+            self._sharedRules = {key: rule for key, rule in self._sharedRules.items() if rule in self._rules}
+
+        return CompactionStatistics(
+            rulesBefore, rulesAfter,
+            productionsBefore, self._bnf.numProductions(),
+            symbolsBefore, len(self._symbols))
 
     def newOrExistingNonTerminal(self, typ: str) -> NonTerminal or None:
         if typ is None:
@@ -13,11 +13,14 @@ if TYPE_CHECKING:
 
 
 class EBNFParsedNodeFactory(ParsedNodeFactory):
-    def __init__(self):
-        pass
+    def __init__(self, memoize: bool = False):
+        self._memoize = memoize
 
     def createNode(self, matcher: Matcher, symbol: Symbol, production: Production or None) -> DefaultParsedNode:
-        return ParsedNode(matcher, symbol, production)
+        return ParsedNode(matcher, symbol, production, self._memoize)
 
 
 INSTANCE = EBNFParsedNodeFactory()
+
+# creates nodes which cache the result of evaluateSelf()
+MEMOIZING_INSTANCE = EBNFParsedNodeFactory(memoize=True)
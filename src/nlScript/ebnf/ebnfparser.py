@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, Callable, cast
+from typing import TYPE_CHECKING, List, Callable, Set, cast
 
 from nlScript.core.rdparser import RDParser
 from nlScript.ebnf import ebnfparsednodefactory
@@ -10,19 +10,23 @@ if TYPE_CHECKING:
     from nlScript.core.lexer import Lexer
     from nlScript.core.rdparser import SymbolSequence
     from nlScript.core.defaultparsednode import DefaultParsedNode
+    from nlScript.ebnf.rule import Rule
 
 
 class EBNFParser(RDParser):
-    def __init__(self, grammar: BNF, lexer: Lexer):
-        super().__init__(grammar, lexer, ebnfparsednodefactory.INSTANCE)
+    def __init__(self, grammar: BNF, lexer: Lexer, rulesWithListeners: Set[Rule] = None, memoizeEvaluation: bool = False):
+        super().__init__(grammar, lexer, ebnfparsednodefactory.MEMOIZING_INSTANCE if memoizeEvaluation else ebnfparsednodefactory.INSTANCE)
         self._parseStartListeners: List[ParseStartListener] = []
+        # if None, all rules are checked for listeners
+        self._rulesWithListeners = rulesWithListeners
 
     def createParsedTree(self,
                          leafSequence: SymbolSequence,
                          retLast: List[DefaultParsedNode] or List[None]) -> DefaultParsedNode:
         self.fireParsingStarted()
         root = super().createParsedTree(leafSequence, retLast)
-        cast(ParsedNode, root).notifyListeners()
+        if self._rulesWithListeners is None or len(self._rulesWithListeners) > 0:
+            cast(ParsedNode, root).notifyListeners(self._rulesWithListeners)
         return root
 
     def addParseStartListener(self, listener: ParseStartListener):
@@ -1,19 +1,79 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Dict, List
 
 from nlScript.core.production import Production
+from nlScript.core.repetition import Repetition
 
 if TYPE_CHECKING:
     from nlScript.ebnf.rule import Rule
     from nlScript.core.nonterminal import NonTerminal
     from nlScript.core.symbol import Symbol
+    from nlScript.parsednode import ParsedNode
 
 
 class EBNFProduction(Production):
-    def __init__(self, rule: Rule, left: NonTerminal, right: List[Symbol]):
+    def __init__(self, rule: Rule, left: NonTerminal, right: List[Symbol], nthEntries: List[int] = None):
         super().__init__(left, right)
         self._rule = rule
+        # the index of each right-hand side symbol within the rule, e.g. the index of the option for an Or
+        self._nthEntries = nthEntries if nthEntries is not None else list(range(len(self.right)))
+        self._childNames: List[str or None] or None = None
+        self._fixedChildNames = False
 
     @property
     def rule(self) -> Rule:
         return self._rule
+
+    def getChildNames(self) -> List[str or None]:
+        """
+        Returns the names of the children of nodes parsed with this production, computed once from the rule.
+        """
+        if self._childNames is None:
+            self._childNames = [self._rule.getNameForChild(nthEntry) for nthEntry in self._nthEntries]
+        return self._childNames
+
+    def setChildNames(self, childNames: List[str or None]) -> None:
+        """
+        Use fixed child names instead of the ones given by the rule. A name of None keeps the default name.
+        """
+        self._childNames = childNames
+        self._fixedChildNames = True
+
+    def resetChildNames(self) -> None:
+        if not self._fixedChildNames:
+            self._childNames = None
+
+    def wasExtended(self, parent: ParsedNode, children: List[ParsedNode]) -> None:
+        for child, nthEntry, name in zip(children, self._nthEntries, self.getChildNames()):
+            child.nthEntryInParent = nthEntry
+            child.name = name
+        super().wasExtended(parent, children)
+
+
+class EBNFRepetition(Repetition):
+    def __init__(self, rule: Rule, left: NonTerminal, entry: Symbol, delimiter: Symbol or None, lower: int, upper: int):
+        super().__init__(left, entry, delimiter, lower, upper)
+        self._rule = rule
+        self._entryNames: Dict[int, str or None] = {}
+
+    @property
+    def rule(self) -> Rule:
+        return self._rule
+
+    def getEntryName(self, nthEntry: int) -> str or None:
+        if nthEntry not in self._entryNames:
+            return self._entryNames.setdefault(nthEntry, self._rule.getNameForChild(nthEntry))
+        return self._entryNames[nthEntry]
+
+    def resetChildNames(self) -> None:
+        self._entryNames = {}
+
+    def wasExtended(self, parent: ParsedNode, children: List[ParsedNode]) -> None:
+        step = 1 if self.delimiter is None else 2
+        for nthEntry, child in enumerate(children[0::step]):
+            child.nthEntryInParent = nthEntry
+            child.name = self.getEntryName(nthEntry)
+        if step == 2:
+            for child in children[1::2]:
+                child.name = "delimiter"
+        super().wasExtended(parent, children)
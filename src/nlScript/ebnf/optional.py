@@ -1,16 +1,14 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, cast
+from typing import TYPE_CHECKING
 
 from nlScript.ebnf.rule import Rule
 from nlScript.evaluator import ALL_CHILDREN_EVALUATOR
-from nlScript.core.production import ExtensionListener, DEFAULT_ASTBUILDER
-from nlScript.parsednode import ParsedNode
+from nlScript.core.production import DEFAULT_ASTBUILDER
 
 if TYPE_CHECKING:
     from nlScript.core.nonterminal import NonTerminal
     from nlScript.core.symbol import Symbol
     from nlScript.core.bnf import BNF
-    from nlScript.core.defaultparsednode import DefaultParsedNode
 
 
 class Optional(Rule):
@@ -25,10 +23,4 @@ class Optional(Rule):
         p1 = self.addProduction(grammar, self, self.tgt, [self.getEntry()])
         self.addProduction(grammar, self, self.tgt, [])
 
-        def onExtension(parent: DefaultParsedNode, children: List[DefaultParsedNode]) -> None:
-            c0 = cast(ParsedNode, children[0])
-            c0.nthEntryInParent = 0
-            c0.name = self.getNameForChild(0)
-        p1.onExtension = ExtensionListener(onExtension)
-
         p1.astBuilder = DEFAULT_ASTBUILDER
@@ -4,7 +4,7 @@ from abc import abstractmethod
 
 from nlScript.core.nonterminal import NonTerminal
 from nlScript.core.representssymbol import RepresentsSymbol
-from nlScript.ebnf.ebnfproduction import EBNFProduction
+from nlScript.ebnf.ebnfproduction import EBNFProduction, EBNFRepetition
 from nlScript.core.named import Named
 from nlScript.evaluator import Evaluator
 
@@ -19,15 +19,22 @@ if TYPE_CHECKING:
 
 
 class Rule(RepresentsSymbol):
+    # incremented whenever a parse listener is set on any rule, so that indices of rules with listeners can be updated
+    listenerModCount = 0
+
     def __init__(self, typ: str, tgt: NonTerminal or None, children: List[Symbol]):
         self._type = typ
-        self._tgt = tgt if tgt is not None else NonTerminal(typ + ":" + NonTerminal.makeRandomSymbol())
+        self._anonymous = tgt is None
+        # anonymous targets are named after the structure of the rule, and numbered when added to a grammar
+        self._tgt = tgt if tgt is not None else NonTerminal(NonTerminal.makeAnonymousSymbol(typ, children))
+        self._numbered = tgt is not None
         self._children = children
         self._parsedChildNames: List[str] or None = None
         self._evaluator = None
         self._autocompleter = None
         self._onSuccessfulParsed = None
-        self._productions: List[EBNFProduction] = []
+        self._memoizable = True
+        self._productions: List[EBNFProduction or EBNFRepetition] = []
 
     def withName(self, name: str or None = None) -> NamedRule:
         return NamedRule(self, name)
@@ -36,6 +43,21 @@ class Rule(RepresentsSymbol):
     def tgt(self) -> NonTerminal:
         return self._tgt
 
+    def isAnonymous(self) -> bool:
+        """
+        Whether this rule was created without a target, i.e. as a helper for other rules.
+        """
+        return self._anonymous
+
+    def nameAnonymousTarget(self, grammar: BNF) -> None:
+        """
+        Gives the target of this rule, if it is anonymous, a name which is unique within the given grammar,
+        see BNF.makeAnonymousSymbol(). This is done once, when the rule is added to a grammar.
+        """
+        if not self._numbered:
+            self._tgt = NonTerminal(grammar.makeAnonymousSymbol(self._type, self._children))
+            self._numbered = True
+
     @property
     def productions(self):
         return self._productions
@@ -67,20 +89,46 @@ class Rule(RepresentsSymbol):
         self._autocompleter = autocompleter
         return self
 
+    def isMemoizable(self) -> bool:
+        return self._memoizable
+
+    def setMemoizable(self, memoizable: bool) -> Rule:
+        """
+        Whether the evaluated value of nodes parsed with this rule may be cached (if the parser memoizes
+        evaluation at all). Rules whose evaluators have side effects should not be memoizable. Nodes
+        whose evaluation involves a non-memoizable rule are not memoized either.
+        """
+        self._memoizable = memoizable
+        return self
+
     def onSuccessfulParsed(self, listener: ParseListener) -> Rule:
         self._onSuccessfulParsed = listener
+        Rule.listenerModCount += 1
         return self
 
     def getOnSuccessfulParsed(self) -> ParseListener:
         return self._onSuccessfulParsed
 
     @staticmethod
-    def addProduction(grammar: BNF, rule: Rule, left: NonTerminal, right: List[Symbol]) -> EBNFProduction:
-        production = EBNFProduction(rule, left, right)
+    def addProduction(grammar: BNF, rule: Rule, left: NonTerminal, right: List[Symbol], nthEntries: List[int] = None) -> EBNFProduction:
+        production = EBNFProduction(rule, left, right, nthEntries)
         rule.productions.append(production)
         grammar.addProduction(production)
         return production
 
+    @staticmethod
+    def addRepetition(grammar: BNF,
+                      rule: Rule,
+                      left: NonTerminal,
+                      entry: Symbol,
+                      delimiter: Symbol or None,
+                      lower: int,
+                      upper: int) -> EBNFRepetition:
+        repetition = EBNFRepetition(rule, left, entry, delimiter, lower, upper)
+        rule.productions.append(repetition)
+        grammar.addProduction(repetition)
+        return repetition
+
     def getNameForChild(self, idx: int) -> str or None:
         if self._parsedChildNames is None:
             return None
@@ -90,8 +138,13 @@ class Rule(RepresentsSymbol):
             return "no name"
         return self._parsedChildNames[idx]
 
+    def getParsedChildNames(self) -> List[str] or None:
+        return self._parsedChildNames
+
     def setParsedChildNames(self, parsedChildNames: List[str]) -> None:
         self._parsedChildNames = parsedChildNames
+        for production in self._productions:
+            production.resetChildNames()
 
     @abstractmethod
     def createBNF(self, grammar: BNF):
@@ -104,3 +157,6 @@ class NamedRule(Named[Rule]):
 
     def onSuccessfulParsed(self, listener: ParseListener) -> None:
         self.get().onSuccessfulParsed(listener)
+
+    def setMemoizable(self, memoizable: bool) -> None:
+        self.get().setMemoizable(memoizable)
@@ -1,15 +1,13 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, cast
+from typing import TYPE_CHECKING, List
 
 from nlScript.ebnf.rule import Rule
-from nlScript.core.production import ExtensionListener, DEFAULT_ASTBUILDER
-from nlScript.parsednode import ParsedNode
+from nlScript.core.production import DEFAULT_ASTBUILDER
 
 if TYPE_CHECKING:
     from nlScript.core.nonterminal import NonTerminal
     from nlScript.core.symbol import Symbol
     from nlScript.core.bnf import BNF
-    from nlScript.core.defaultparsednode import DefaultParsedNode
 
 
 class Sequence(Rule):
@@ -18,12 +16,4 @@ class Sequence(Rule):
 
     def createBNF(self, grammar: BNF):
         p = self.addProduction(grammar, self, self.tgt, self._children)
-
-        def onExtension(parent: DefaultParsedNode, children: List[DefaultParsedNode]) -> None:
-            for idx, child in enumerate(children):
-                ch = cast(ParsedNode, child)
-                ch.nthEntryInParent = idx
-                ch.name = self.getNameForChild(idx)
-        p.onExtension = ExtensionListener(onExtension)
-
         p.astBuilder = DEFAULT_ASTBUILDER
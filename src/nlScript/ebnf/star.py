@@ -1,16 +1,14 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, cast
+from typing import TYPE_CHECKING
 
 from nlScript.ebnf.rule import Rule
 from nlScript.evaluator import ALL_CHILDREN_EVALUATOR
-from nlScript.core.production import AstBuilder, ExtensionListener
-from nlScript.parsednode import ParsedNode
+from nlScript.util.range import MAX_VALUE
 
 if TYPE_CHECKING:
     from nlScript.core.nonterminal import NonTerminal
     from nlScript.core.symbol import Symbol
     from nlScript.core.bnf import BNF
-    from nlScript.core.defaultparsednode import DefaultParsedNode
 
 
 class Star(Rule):
@@ -22,21 +20,4 @@ class Star(Rule):
         return self.children[0]
 
     def createBNF(self, grammar: BNF):
-        p1 = self.addProduction(grammar, self, self.tgt, [self.getEntry(), self.tgt])
-        self.addProduction(grammar, self, self.tgt, [])
-
-        def onExtension(parent: DefaultParsedNode, children: List[DefaultParsedNode]) -> None:
-            nthEntry = cast(ParsedNode, parent).nthEntryInParent
-            c0 = cast(ParsedNode, children[0])
-            c1 = cast(ParsedNode, children[1])
-
-            c0.nthEntryInParent = nthEntry
-            c0.name = self.getNameForChild(nthEntry)
-            c1.nthEntryInParent = nthEntry + 1
-            c1.name = parent.name
-        p1.onExtension = ExtensionListener(onExtension)
-
-        def buildAst(parent: DefaultParsedNode, children: List[DefaultParsedNode]):
-            parent.addChildren([children[0]])
-            parent.addChildren(children[1].children)
-        p1.astBuilder = AstBuilder(buildAst)
+        self.addRepetition(grammar, self, self.tgt, self.getEntry(), None, 0, MAX_VALUE)
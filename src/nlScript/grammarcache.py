@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, cast
+
+from nlScript.autocompleter import DEFAULT_INLINE_AUTOCOMPLETER
+from nlScript.core.nonterminal import NonTerminal
+from nlScript.core.terminal import Literal, CharacterClass, literal, characterClass
+from nlScript.ebnf.join import Join
+from nlScript.ebnf.optional import Optional
+from nlScript.ebnf.plus import Plus
+from nlScript.ebnf.repeat import Repeat
+from nlScript.ebnf.star import Star
+from nlScript.util.range import Range, STAR, PLUS, OPTIONAL
+
+if TYPE_CHECKING:
+    from nlScript.core.named import Named
+    from nlScript.core.symbol import Symbol
+    from nlScript.parser import Parser
+
+
+class GrammarCache:
+    """
+    On-disk cache of translated sentence patterns, so that a Parser which is built from the same
+    definitions again (e.g. after a restart) does not need to parse the patterns with the meta-grammar.
+
+    Entries are keyed by a fingerprint of the pattern and of the cache format. A pattern's translation
+    only refers to types by name, which are resolved (and rules rebuilt) when the entry is used, so
+    changing a definition simply results in a different fingerprint. Evaluators and autocompleters are
+    not stored: they are bound by the defineType()/defineSentence() calls as usual.
+    """
+
+    # increment whenever the meta-grammar or the encoding below changes, to invalidate existing caches
+    FORMAT_VERSION = 1
+    FILE_NAME = "nlscript-grammar-cache.json"
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._entries: Dict[str, List] or None = None
+        self._modified = False
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self._directory, GrammarCache.FILE_NAME)
+
+    @staticmethod
+    def fingerprint(pattern: str) -> str:
+        key = str(GrammarCache.FORMAT_VERSION) + "\0" + pattern
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def getEntries(self) -> Dict[str, List]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    content = json.load(f)
+                if content.get("version") == GrammarCache.FORMAT_VERSION:
+                    self._entries = content["entries"]
+            except (OSError, ValueError, KeyError, AttributeError):
+                # a missing or unreadable cache is simply empty
+                pass
+        return self._entries
+
+    def get(self, pattern: str) -> List or None:
+        return self.getEntries().get(GrammarCache.fingerprint(pattern))
+
+    def put(self, pattern: str, encoded: List) -> None:
+        self.getEntries()[GrammarCache.fingerprint(pattern)] = encoded
+        self._modified = True
+
+    def isModified(self) -> bool:
+        return self._modified
+
+    def clear(self) -> None:
+        self._entries = {}
+        self._modified = True
+
+    def save(self) -> None:
+        """
+        Writes the cache to disk, if it was modified. The file is replaced atomically, so that
+        concurrent readers never see a partially written cache.
+        """
+        if not self._modified:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self._directory, prefix=".nlscript-grammar-cache")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": GrammarCache.FORMAT_VERSION, "entries": self.getEntries()}, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self._modified = False
+
+    @staticmethod
+    def encode(parser: Parser, rhs: List[Named]) -> List or None:
+        """
+        Encodes the right-hand side of a translated pattern as JSON-compatible lists,
+        or returns None if it contains something which cannot be encoded.
+        """
+        try:
+            return [[named.name, GrammarCache.encodeSymbol(parser, named.getSymbol())] for named in rhs]
+        except ValueError:
+            return None
+
+    @staticmethod
+    def encodeSymbol(parser: Parser, symbol: Symbol) -> List:
+        if isinstance(symbol, Literal):
+            return ["literal", cast(Literal, symbol).getLiteral()]
+        if isinstance(symbol, CharacterClass):
+            return ["class", symbol.symbol]
+        rules = parser.targetGrammar.getRules(cast(NonTerminal, symbol)) if symbol.isNonTerminal() else []
+        if len(rules) == 0 or not rules[0].isAnonymous():
+            # a type of the target grammar, referenced by name
+            return ["type", symbol.symbol]
+        if len(rules) > 1:
+            raise ValueError("Cannot encode " + symbol.symbol)
+
+        rule = rules[0]
+        if isinstance(rule, Join):
+            join = cast(Join, rule)
+            entry = GrammarCache.encodeSymbol(parser, join.getEntry())
+            if join.jopen is not None:
+                return ["tuple", entry, join.getParsedChildNames()]
+            return ["list", entry, join.getNameForChild(0), join.cardinality.lower, join.cardinality.upper]
+
+        inline = rule.getAutocompleter() is DEFAULT_INLINE_AUTOCOMPLETER
+        entry = GrammarCache.encodeSymbol(parser, rule.children[0])
+        name = rule.getNameForChild(0)
+        if isinstance(rule, Star):
+            return ["star", entry, name, inline]
+        if isinstance(rule, Plus):
+            return ["plus", entry, name, inline]
+        if isinstance(rule, Optional):
+            return ["optional", entry, name, inline]
+        if isinstance(rule, Repeat):
+            repeat = cast(Repeat, rule)
+            return ["repeat", entry, name, inline, repeat.rfrom, repeat.rto]
+        raise ValueError("Cannot encode " + symbol.symbol)
+
+    @staticmethod
+    def decode(parser: Parser, encoded: List) -> List[Named]:
+        """
+        Rebuilds the right-hand side of a translated pattern in the parser's target grammar.
+        Raises a KeyError if a referenced type does not exist, and a ValueError, IndexError or
+        TypeError if the entry is malformed.
+        """
+        return [GrammarCache.decodeSymbol(parser, e[1]).withName(e[0]) for e in encoded]
+
+    @staticmethod
+    def decodeSymbol(parser: Parser, encoded: List) -> Symbol:
+        kind = encoded[0]
+        if kind == "literal":
+            return literal(encoded[1])
+        if kind == "class":
+            return characterClass(encoded[1])
+        if kind == "type":
+            symbol = parser.resolveType(encoded[1])
+            if symbol is None:
+                raise KeyError("Unknown type '" + encoded[1] + "'")
+            return symbol
+
+        entry = GrammarCache.decodeSymbol(parser, encoded[1])
+        grammar = parser.targetGrammar
+        if kind == "tuple":
+            return grammar.tuple(None, entry.withName(), encoded[2]).tgt
+        if kind == "list":
+            join = cast(Join, grammar.list(None, entry.withName(encoded[2])))
+            cardinality = Range(encoded[3], encoded[4])
+            if cardinality != join.cardinality:
+                join.cardinality = cardinality
+            return join.tgt
+
+        autocompleter = DEFAULT_INLINE_AUTOCOMPLETER if encoded[3] else None
+        if kind == "star":
+            cardinality = STAR
+        elif kind == "plus":
+            cardinality = PLUS
+        elif kind == "optional":
+            cardinality = OPTIONAL
+        elif kind == "repeat":
+            cardinality = Range(encoded[4], encoded[5])
+        else:
+            raise ValueError("Unknown kind of symbol '" + str(kind) + "'")
+        return parser.quantify(entry.withName(encoded[2]), cardinality, autocompleter).getSymbol()
@@ -1,13 +1,14 @@
 from __future__ import annotations
+from contextvars import ContextVar
 from typing import TYPE_CHECKING
 
 from nlScript.core.defaultparsednode import DefaultParsedNode
 from nlScript.core.parsingstate import ParsingState
 
-from nlScript.ebnf.ebnfproduction import EBNFProduction
+from nlScript.ebnf.ebnfproduction import EBNFProduction, EBNFRepetition
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import List, Set
     from nlScript.core.matcher import Matcher
     from nlScript.core.symbol import Symbol
     from nlScript.core.production import Production
@@ -15,10 +16,18 @@ if TYPE_CHECKING:
     from nlScript.core.autocompletion import Autocompletion
 
 
+# set while a memoizing node is evaluated: a flag which records whether a non-memoizable rule was evaluated meanwhile,
+# in which case the node's value is not memoized either; per context, so that concurrent evaluations do not interfere
+NON_MEMOIZABLE_EVALUATED: ContextVar[List[bool] or None] = ContextVar("NON_MEMOIZABLE_EVALUATED", default=None)
+
+
 class ParsedNode(DefaultParsedNode):
-    def __init__(self, matcher: Matcher, symbol: Symbol, production: Production):
+    def __init__(self, matcher: Matcher, symbol: Symbol, production: Production, memoize: bool = False):
         super().__init__(matcher, symbol, production)
         self._nthEntryInParent = 0
+        self._memoize = memoize
+        self._evaluated = False
+        self._value = None
 
     @property
     def nthEntryInParent(self) -> int:
@@ -30,7 +39,7 @@ class ParsedNode(DefaultParsedNode):
 
     def getRule(self) -> Rule or None:
         production = super().production
-        if production is not None and isinstance(production, EBNFProduction):
+        if production is not None and isinstance(production, (EBNFProduction, EBNFRepetition)):
             return production.rule
         return None
 
@@ -52,22 +61,56 @@ class ParsedNode(DefaultParsedNode):
             return rule.getAutocompleter().getAutocompletion(self, justCheck)
         return super().getAutocompletion(justCheck)
 
-    def notifyListeners(self) -> None:
+    def notifyListeners(self, rulesWithListeners: Set[Rule] = None) -> None:
         for child in self.children:
-            child.notifyListeners()
+            child.notifyListeners(rulesWithListeners)
 
+        rule = self.getRule()
+        if rule is None or (rulesWithListeners is not None and rule not in rulesWithListeners):
+            return
         state: ParsingState = self.matcher.state
         if state != ParsingState.SUCCESSFUL and state != ParsingState.END_OF_INPUT:
             return
-        rule = self.getRule()
-        if rule is not None and not self.parentHasSameRule():
+        if not self.parentHasSameRule():
             listener = rule.getOnSuccessfulParsed()
             if listener is not None:
                 listener.parsed(self)
 
     def evaluateSelf(self) -> object:
+        if self._evaluated:
+            return self._value
+
         rule = self.getRule()
-        if rule is not None and rule.getEvaluator() is not None:
-            return rule.getEvaluator().evaluate(self)
+        nonMemoizableEvaluated = [False]
+        token = NON_MEMOIZABLE_EVALUATED.set(nonMemoizableEvaluated) if self._memoize else None
+        try:
+            if rule is not None and rule.getEvaluator() is not None:
+                value = rule.getEvaluator().evaluate(self)
+            else:
+                value = super().evaluateSelf()
+        finally:
+            if token is not None:
+                NON_MEMOIZABLE_EVALUATED.reset(token)
+
+        if (rule is not None and not rule.isMemoizable()) or nonMemoizableEvaluated[0]:
+            outer = NON_MEMOIZABLE_EVALUATED.get()
+            if outer is not None:
+                outer[0] = True
+        elif self._memoize:
+            self._value = value
+            self._evaluated = True
+        return value
 
-        return super().evaluateSelf()
+    def invalidateEvaluation(self, descendants: bool = False) -> None:
+        """
+        Discards the memoized value of this node and of all its ancestors, which may depend on it.
+        If descendants is True, also the memoized values of all nodes below this one are discarded.
+        """
+        pn = self
+        while pn is not None:
+            pn._evaluated = False
+            pn._value = None
+            pn = pn.parent
+        if descendants:
+            for child in self.children:
+                child.invalidateEvaluation(True)
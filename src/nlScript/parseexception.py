@@ -7,7 +7,6 @@ from nlScript.core.autocompletion import Purpose
 
 if TYPE_CHECKING:
     from nlScript.core.defaultparsednode import DefaultParsedNode
-    from nlScript.core.bnf import BNF
     from nlScript.core.autocompletion import Autocompletion
     from nlScript.core.rdparser import RDParser
 
@@ -37,32 +36,27 @@ class ParseException(Exception):
         return self._firstAutocompletingAncestorThatFailed
 
     def getError(self) -> str:
-        from nlScript.core.rdparser import RDParser
-
         lexer: Lexer = self._parser.getLexer()
-        grammar: BNF = self._parser.getGrammar()
 
-        errorPos: int = self._failedTerminal.matcher.pos + len(self._failedTerminal.matcher.parsed) - 1
+        failedPos: int = self._failedTerminal.matcher.pos
+        errorPos: int = failedPos + len(self._failedTerminal.matcher.parsed) - 1
 
         # the character at last.matcher.pos failed, everything before must have been working
-        workingText: str = lexer.substring(0, self._failedTerminal.matcher.pos)
-        # create a new parser and collect the autocompletions
-        workingLexer = Lexer(workingText)
-        parser2 = RDParser(grammar, workingLexer, self._parser.getParsedNodeFactory())
-        expectations: List[Autocompletion] = []
-        try:
-            parser2.parse(expectations)
-        except ParseException:
-            return "Error at position " + str(errorPos)
+        expectations: List[Autocompletion] or None = self._parser.getExpectations(failedPos)
+        if expectations is None:
+            expectations = self.parseExpectations(failedPos)
+            if expectations is None:
+                return "Error at position " + str(errorPos)
 
-        lines: List[str] = lexer.substring(0, errorPos + 1).splitlines()
-        errorLine: int = len(lines) - 1
-        errorPosInLastLine = len(lines[errorLine]) - 1
+        errorLine, errorPosInLine = lexer.getLineAndColumn(max(errorPos, 0))
+        # if the error is at a line break, the caret points to the end of the line before
+        line = lexer.getLine(errorLine)
+        errorPosInLine = min(errorPosInLine, len(line) - 1)
 
         nl = "\n"
         errorMessage = "Error at position " + str(errorPos) + " in line " + str(errorLine) + ":" + nl
-        errorMessage += lines[errorLine] + nl
-        for i in range(errorPosInLastLine):
+        errorMessage += line[:errorPosInLine + 1] + nl
+        for i in range(errorPosInLine):
             errorMessage += " "
         errorMessage += "^" + nl
 
@@ -71,5 +65,18 @@ class ParseException(Exception):
 
         return errorMessage
 
+    def parseExpectations(self, failedPos: int) -> List[Autocompletion] or None:
+        """
+        Collects the expectations at the given position by parsing the text up to there again.
+        This is only necessary if they were not recorded by the original parse.
+        """
+        from nlScript.core.rdparser import RDParser
 
-
+        workingLexer = Lexer(self._parser.getLexer().substring(0, failedPos))
+        parser2 = RDParser(self._parser.getGrammar(), workingLexer, self._parser.getParsedNodeFactory())
+        expectations: List[Autocompletion] = []
+        try:
+            parser2.parse(expectations)
+        except ParseException:
+            return None
+        return expectations
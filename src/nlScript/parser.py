@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, cast, List, Dict, Callable
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, cast, List, Dict, Callable, Tuple, Set
 
 from nlScript.core.autocompletion import Autocompletion
 from nlScript.core.lexer import Lexer
@@ -13,23 +17,103 @@ from nlScript.ebnf.ebnfparser import EBNFParser, ParseStartListener
 from nlScript.evaluator import Evaluator, FIRST_CHILD_EVALUATOR, DEFAULT_EVALUATOR
 from nlScript.util.range import OPTIONAL, PLUS, STAR, Range
 from nlScript.core.nonterminal import NonTerminal
-from nlScript.autocompleter import Autocompleter, DEFAULT_INLINE_AUTOCOMPLETER, EntireSequenceAutocompleter
+from nlScript.autocompleter import Autocompleter, DEFAULT_INLINE_AUTOCOMPLETER, EntireSequenceAutocompleter, CURRENT_GRAMMAR
 from nlScript.parsednode import ParsedNode
 from nlScript.core.symbol import Symbol
 from nlScript.core.named import Named
 from nlScript.ebnf.join import Join
+from nlScript.grammarcache import GrammarCache
 
 if TYPE_CHECKING:
+    from nlScript.ebnf.compactionstatistics import CompactionStatistics
     from nlScript.ebnf.rule import Rule, NamedRule
 
 
+logger = logging.getLogger(__name__)
+
+# the Parser whose target grammar is extended while evaluating the meta-grammar, see Parser.current()
+CURRENT_PARSER: ContextVar[Parser or None] = ContextVar("CURRENT_PARSER", default=None)
+
+
 class Parser:
+    # the meta-grammar for parsing sentence patterns; it is built once, frozen and shared by all instances
+    metaGrammar: EBNF or None = None
+    metaRules: Dict[str, Rule] = {}
+    # guards building the meta-grammar, so that Parsers created concurrently do not build it twice
+    metaGrammarLock = threading.Lock()
 
-    def __init__(self):
+    def __init__(self, parent: Parser = None):
         self._parseStartListeners: List[ParseStartListener] = []
+        self._grammar: EBNF or None = None
+        # the Parser this one was derived from, see derive()
+        self._parent: Parser or None = parent
+        self._targetGrammar = EBNF() if parent is None else cast(EBNF, parent._targetGrammar.derive())
+        self._compiled = False if parent is None else parent._compiled
+        self._memoizeEvaluation = False if parent is None else parent._memoizeEvaluation
+        self._suspendGC = False if parent is None else parent._suspendGC
+        self._autocompletionTimeout: float or None = None if parent is None else parent._autocompletionTimeout
+        # pattern -> (translated right-hand side, target grammar types it referenced)
+        self._patternCache: Dict[str, Tuple[List[Named], Dict[str, Symbol]]] = {}
+        self._referencedTypes: Dict[str, Symbol] or None = None
+        self._grammarCache: GrammarCache or None = None if parent is None else parent._grammarCache
+        if Parser.metaGrammar is None:
+            with Parser.metaGrammarLock:
+                if Parser.metaGrammar is None:
+                    self.buildMetaGrammar()
+        meta = Parser.metaRules
+        self.QUANTIFIER = meta["QUANTIFIER"]
+        self.IDENTIFIER = meta["IDENTIFIER"]
+        self.VARIABLE_NAME = meta["VARIABLE_NAME"]
+        self.ENTRY_NAME = meta["ENTRY_NAME"]
+        self.LIST = meta["LIST"]
+        self.TUPLE = meta["TUPLE"]
+        self.CHARACTER_CLASS = meta["CHARACTER_CLASS"]
+        self.TYPE = meta["TYPE"]
+        self.VARIABLE = meta["VARIABLE"]
+        self.NO_VARIABLE = meta["NO_VARIABLE"]
+        self.EXPRESSION = meta["EXPRESSION"]
+
+        self.LINEBREAK = literal("\n")
+        if parent is None:
+            self.LINEBREAK_STAR = self._targetGrammar.star("linebreak-star", self.LINEBREAK.withName())
+            self.program()
+        else:
+            self.LINEBREAK_STAR = parent.LINEBREAK_STAR
+
+        # autocompletions of sequence children on empty input, see EntireSequenceAutocompleter.getTemplate()
+        self._symbol2Autocompletion: Dict[Tuple[str, str], List[Autocompletion] or None] = {}
+        # rules whose entire-sequence autocompletion is precomputed by the next compile()
+        self._pendingTemplates: List[Tuple[EntireSequenceAutocompleter, Rule]] = []
+
+    def derive(self) -> Parser:
+        """
+        Returns a new Parser which initially understands the same sentences as this one, and to which
+        further types and sentences can be added (or from which they can be removed) independently, e.g.
+        for different users of an application. The target grammar of the new Parser only stores its own
+        changes and looks up everything else in this Parser's target grammar, so deriving is cheap, no
+        matter how large this grammar is. This Parser is compiled and then frozen, i.e. it can still be
+        used for parsing, but types and sentences can no longer be defined or undefined.
+        """
+        if not self._compiled:
+            self.compile()
+        return Parser(parent=self)
+
+    def getParent(self) -> Parser or None:
+        return self._parent
+
+    @staticmethod
+    def current() -> Parser:
+        """
+        Returns the Parser which evaluates the meta-grammar in the current context, i.e. whose
+        target grammar is extended by the meta-grammar's evaluators, see evaluatePattern().
+        """
+        parser = CURRENT_PARSER.get()
+        if parser is None:
+            raise Exception("No Parser to evaluate the meta-grammar for")
+        return parser
+
+    def buildMetaGrammar(self) -> None:
         self._grammar = EBNF()
-        self._targetGrammar = EBNF()
-        self._compiled = False
         self.QUANTIFIER = self.quantifier()
         self.IDENTIFIER = self.identifier()
         self.VARIABLE_NAME = self.variableName()
@@ -41,21 +125,86 @@ class Parser:
         self.VARIABLE = self.variable()
         self.NO_VARIABLE = self.noVariable()
         self.EXPRESSION = self.expression()
-
-        self.LINEBREAK = literal("\n")
-        self.LINEBREAK_STAR = self._targetGrammar.star("linebreak-star", self.LINEBREAK.withName())
-        self.program()
-
-        self._symbol2Autocompletion: Dict[str, List[Autocompletion]] = {}
+        self._grammar.compile(self.EXPRESSION.tgt)
+        self._grammar.freeze()
+        Parser.metaRules = {
+            "QUANTIFIER": self.QUANTIFIER,
+            "IDENTIFIER": self.IDENTIFIER,
+            "VARIABLE_NAME": self.VARIABLE_NAME,
+            "ENTRY_NAME": self.ENTRY_NAME,
+            "LIST": self.LIST,
+            "TUPLE": self.TUPLE,
+            "CHARACTER_CLASS": self.CHARACTER_CLASS,
+            "TYPE": self.TYPE,
+            "VARIABLE": self.VARIABLE,
+            "NO_VARIABLE": self.NO_VARIABLE,
+            "EXPRESSION": self.EXPRESSION
+        }
+        Parser.metaGrammar = self._grammar
+        self._grammar = None
 
     @property
     def grammar(self) -> EBNF:
+        """
+        A modifiable copy of the shared meta-grammar, which is created on first access, e.g. to parse
+        parts of patterns in tests. It is private to this Parser and not used by it: changes to it do not
+        affect defineType(), defineSentence() or translatePattern(), which always use the shared meta-grammar.
+        """
+        if self._grammar is None:
+            self._grammar = EBNF(Parser.metaGrammar)
         return self._grammar
 
     @property
     def targetGrammar(self) -> EBNF:
         return self._targetGrammar
 
+    @property
+    def memoizeEvaluation(self) -> bool:
+        """
+        Whether parsed nodes cache their evaluated value, so that evaluating the same node again
+        does not re-run its evaluator. Individual rules can opt out via Rule.setMemoizable(False).
+        """
+        return self._memoizeEvaluation
+
+    @memoizeEvaluation.setter
+    def memoizeEvaluation(self, memoize: bool) -> None:
+        self._memoizeEvaluation = memoize
+
+    @property
+    def grammarCache(self) -> GrammarCache or None:
+        """
+        An optional on-disk cache of translated sentence patterns, which is consulted by defineType()
+        and defineSentence() and written by compile(), to speed up building the same grammar again.
+        """
+        return self._grammarCache
+
+    @grammarCache.setter
+    def grammarCache(self, grammarCache: GrammarCache or None) -> None:
+        self._grammarCache = grammarCache
+
+    @property
+    def suspendGC(self) -> bool:
+        """
+        Whether the cyclic garbage collector is disabled during parse().
+        """
+        return self._suspendGC
+
+    @suspendGC.setter
+    def suspendGC(self, suspendGC: bool) -> None:
+        self._suspendGC = suspendGC
+
+    @property
+    def autocompletionTimeout(self) -> float or None:
+        """
+        The time in seconds parse() waits for autocompleters which return a Future or an awaitable (e.g. from
+        an async function). These run concurrently; results which are late are dropped. None waits for all.
+        """
+        return self._autocompletionTimeout
+
+    @autocompletionTimeout.setter
+    def autocompletionTimeout(self, autocompletionTimeout: float or None) -> None:
+        self._autocompletionTimeout = autocompletionTimeout
+
     def defineSentence(
             self,
             pattern: str,
@@ -76,39 +225,206 @@ class Parser:
         elif type(autocompleter) is bool and not autocompleter:
             autocompleterToUse = DEFAULT_INLINE_AUTOCOMPLETER
 
-        self._grammar.compile(self.EXPRESSION.tgt)
-        parser = RDParser(self._grammar.getBNF(), Lexer(pattern), ebnfparsednodefactory.INSTANCE)
-        pn = parser.parse()
-        if pn.matcher.state != ParsingState.SUCCESSFUL:
-            raise Exception("Parsing failed")
-        rhs = cast(List[Named], pn.evaluate())
+        rhs = self.translatePattern(pattern)
 
         newRule = self._targetGrammar.sequence(typ, rhs)
         if evaluator is not None:
             newRule.setEvaluator(evaluator)
         if autocompleterToUse is not None:
             newRule.setAutocompleter(autocompleterToUse)
+            if isinstance(autocompleterToUse, EntireSequenceAutocompleter):
+                self._pendingTemplates.append((autocompleterToUse, newRule))
+        self._compiled = False
 
         return newRule.withName(typ)
 
+    def defineSentences(
+            self,
+            sentences: List[str or Tuple]) -> List[NamedRule]:
+        """
+        Defines several sentences in one call. Each entry is either a pattern, or a tuple of the arguments
+        to defineSentence(), i.e. (pattern, evaluator) or (pattern, evaluator, autocompleter).
+        """
+        return [self.defineSentence(s) if isinstance(s, str) else self.defineSentence(*s) for s in sentences]
+
+    def translatePattern(self, pattern: str) -> List[Named]:
+        """
+        Parses a sentence pattern with the meta-grammar and returns the corresponding right-hand side
+        of the target grammar rule. Results are cached by pattern, and a cached result is only reused
+        if the types it references still resolve to the same symbols and the helper rules it created
+        (e.g. for lists or quantifiers) are still part of the target grammar.
+        """
+        cached = self.getCachedTranslation(pattern)
+        if cached is not None and self.isValidTranslation(*cached):
+            return cached[0]
+
+        if self._grammarCache is not None:
+            encoded = self._grammarCache.get(pattern)
+            if encoded is not None:
+                self._referencedTypes = {}
+                try:
+                    rhs = GrammarCache.decode(self, encoded)
+                    self._patternCache[pattern] = (rhs, self._referencedTypes)
+                    return rhs
+                except (KeyError, ValueError, IndexError, TypeError):
+                    # a referenced type does not exist (yet), or the entry is malformed; translate the pattern as usual
+                    pass
+                except Exception:
+                    logger.warning("Could not decode the cached translation of '%s'", pattern, exc_info=True)
+                finally:
+                    self._referencedTypes = None
+
+        parser = RDParser(Parser.metaGrammar.getBNF(), Lexer(pattern), ebnfparsednodefactory.INSTANCE)
+        pn = parser.parse()
+        if pn.matcher.state != ParsingState.SUCCESSFUL:
+            raise Exception("Parsing failed")
+        self._referencedTypes = {}
+        try:
+            rhs = cast(List[Named], self.evaluatePattern(pn))
+            self._patternCache[pattern] = (rhs, self._referencedTypes)
+        finally:
+            self._referencedTypes = None
+
+        if self._grammarCache is not None:
+            encoded = GrammarCache.encode(self, rhs)
+            if encoded is not None:
+                self._grammarCache.put(pattern, encoded)
+        return rhs
+
+    def evaluatePattern(self, pn: ParsedNode) -> object:
+        """
+        Evaluates a node parsed with the meta-grammar (or a copy of it, see grammar), adding the rules it describes
+        to the target grammar of this Parser. While evaluating, this Parser is the one returned by current().
+        """
+        token = CURRENT_PARSER.set(self)
+        try:
+            return pn.evaluate()
+        finally:
+            CURRENT_PARSER.reset(token)
+
+    def getCachedTranslation(self, pattern: str) -> Tuple[List[Named], Dict[str, Symbol]] or None:
+        """
+        Returns the cached translation of the given pattern, looking it up in the parent if this Parser was derived.
+        """
+        cached = self._patternCache.get(pattern)
+        if cached is None and self._parent is not None:
+            cached = self._parent.getCachedTranslation(pattern)
+        return cached
+
+    def isValidTranslation(self, rhs: List[Named], referencedTypes: Dict[str, Symbol]) -> bool:
+        for typ, symbol in referencedTypes.items():
+            if self._targetGrammar.getSymbol(typ) is not symbol:
+                return False
+        for named in rhs:
+            symbol = named.getSymbol()
+            if symbol.isNonTerminal() and symbol.symbol not in referencedTypes and \
+                    len(self._targetGrammar.getRules(cast(NonTerminal, symbol))) == 0:
+                return False
+        return True
+
+    def resolveType(self, typ: str) -> Symbol or None:
+        """
+        Looks up a type in the target grammar while translating a pattern.
+        """
+        symbol = self._targetGrammar.getSymbol(typ)
+        if self._referencedTypes is not None:
+            self._referencedTypes[typ] = symbol
+        return symbol
+
+    def quantify(self, namedSymbol: Named, range: Range, autocompleter: Autocompleter or None) -> Named:
+        """
+        Wraps a (named) symbol of a sentence pattern into a star, plus, optional or repeat rule of the target grammar.
+        """
+        if range == STAR:
+            rule = self._targetGrammar.star(None, namedSymbol)
+        elif range == PLUS:
+            rule = self._targetGrammar.plus(None, namedSymbol)
+        elif range == OPTIONAL:
+            rule = self._targetGrammar.optional(None, namedSymbol)
+        else:
+            rule = self._targetGrammar.repeat(None, namedSymbol, rfrom=range.lower, rto=range.upper)
+        rule.setAutocompleter(autocompleter)
+        return rule.tgt.withName(namedSymbol.name)
+
     def undefineType(self, atype: str) -> None:
         unitsSymbol: NonTerminal = cast(NonTerminal, self.targetGrammar.getSymbol(atype))
         self.targetGrammar.removeRules(unitsSymbol)
         self._compiled = False
 
-    def compile(self, symbol: Symbol = None) -> None:
+    def compile(self, symbol: Symbol = None) -> CompactionStatistics:
+        """
+        Compiles the target grammar for the given top-level symbol (by default 'program') and removes
+        helper rules which are not used anymore, e.g. by types which were undefined. Only the parts of
+        the grammar which changed since the last compilation are visited. Returns the sizes of the
+        target grammar before and after this compaction. If a grammar cache is set, it is saved.
+
+        Entire-sequence autocompletions of newly defined types and sentences are precomputed, and those
+        depending on changed parts of the grammar are invalidated, so that parsing does not need to
+        compute them again for every input.
+        """
         if symbol is None:
             symbol = self._targetGrammar.getSymbol("program")
+        changed = self._targetGrammar.getChangedSymbols()
         self._targetGrammar.compile(symbol)
+        statistics = self._targetGrammar.compact()
+        if statistics.getRemovedRules() > 0:
+            self._patternCache = {pattern: cached for pattern, cached in self._patternCache.items()
+                                  if self.isValidTranslation(*cached)}
+        if len(changed) > 0:
+            self.invalidateAutocompletions(changed)
+        pending = self._pendingTemplates
+        self._pendingTemplates = []
+        with self.autocompletingFor():
+            for autocompleter, rule in pending:
+                if self._targetGrammar.containsRule(rule):
+                    autocompleter.precomputeTemplate(rule)
+        if self._grammarCache is not None:
+            self._grammarCache.save()
         self._compiled = True
+        return statistics
+
+    def invalidateAutocompletions(self, changed: List[str]) -> None:
+        """
+        Removes the cached autocompletions of the given symbols, and of all symbols which (directly or
+        indirectly) derive one of them, because their autocompletions might have changed.
+        """
+        bnf = self._targetGrammar.getBNF()
+        affected: Set[str] = set()
+        stack = list(changed)
+        while len(stack) > 0:
+            symbol = stack.pop()
+            if symbol in affected:
+                continue
+            affected.add(symbol)
+            for p in bnf.getReferencesOf(symbol):
+                stack.append(p.left.symbol)
+        for key in [key for key in self._symbol2Autocompletion if key[0] in affected]:
+            del self._symbol2Autocompletion[key]
 
     def parse(self, text: str, autocompletions: List[Autocompletion] or None = None) -> ParsedNode:
         if not self._compiled:
             self.compile()
-        self._symbol2Autocompletion.clear()
-        rdParser = EBNFParser(self._targetGrammar.getBNF(), Lexer(text))
+        rdParser = EBNFParser(self._targetGrammar.getBNF(),
+                              Lexer(text),
+                              self._targetGrammar.getRulesWithListeners(),
+                              self._memoizeEvaluation)
+        rdParser.suspendGC = self._suspendGC
+        rdParser.autocompletionTimeout = self._autocompletionTimeout
         rdParser.addParseStartListener(ParseStartListener(self.fireParsingStarted))
-        return cast(ParsedNode, rdParser.parse(autocompletions))
+        with self.autocompletingFor():
+            return cast(ParsedNode, rdParser.parse(autocompletions))
+
+    @contextmanager
+    def autocompletingFor(self):
+        """
+        Makes entire-sequence autocompleters use the target grammar and the autocompletion cache of this Parser,
+        also for rules which were defined in the Parser this one was derived from.
+        """
+        token = CURRENT_GRAMMAR.set((self._targetGrammar, self._symbol2Autocompletion))
+        try:
+            yield
+        finally:
+            CURRENT_GRAMMAR.reset(token)
 
     def quantifier(self) -> Rule:
         g = self._grammar
@@ -167,13 +483,13 @@ class Parser:
 
         def evaluate(pn: ParsedNode) -> object:
             identifier: str = cast(str, pn.evaluateChildByNames("type"))
-            entry: Symbol or None = self._targetGrammar.getSymbol(identifier)
+            entry: Symbol or None = Parser.current().resolveType(identifier)
 
             namedEntry = \
                 cast(Terminal, entry).withName(identifier) if isinstance(entry, Terminal) else \
                 cast(NonTerminal, entry).withName(identifier)
 
-            return self._targetGrammar.list(None, namedEntry)
+            return Parser.current().targetGrammar.list(None, namedEntry)
 
         ret.setEvaluator(evaluate)
         return ret
@@ -209,11 +525,11 @@ class Parser:
             plus = pn.getChild("plus-names")
             entryNames = list(map(lambda dpn: str(dpn.evaluate("entry-name")), plus.children))
 
-            entry = self._targetGrammar.getSymbol(typ)
+            entry = Parser.current().resolveType(typ)
             namedEntry = \
                 cast(Terminal, entry).withName() if isinstance(entry, Terminal) else \
                 cast(NonTerminal, entry).withName()
-            return self._targetGrammar.tuple(None, namedEntry, entryNames).tgt
+            return Parser.current().targetGrammar.tuple(None, namedEntry, entryNames).tgt
 
         ret.setEvaluator(evaluate)
         return ret
@@ -242,7 +558,7 @@ class Parser:
 
         def evaluate(pn: ParsedNode):
             string: str = pn.getParsedString()
-            symbol: Symbol = self._targetGrammar.getSymbol(string)
+            symbol: Symbol = Parser.current().resolveType(string)
             if symbol is None:
                 raise Exception("Unknow type '" + string + "'")
             return symbol
@@ -315,17 +631,7 @@ class Parser:
                 # set a new fallback autocompleter. This is important for e.g. {bla:[a-z]:4} or {bla:digit:4}
                 if isinstance(typeObject, Terminal):
                     autocompleter = DEFAULT_INLINE_AUTOCOMPLETER
-                range = cast(Range, quantifierObject)
-                if range == STAR:
-                    symbol = self._targetGrammar.star(None, namedSymbol).setAutocompleter(autocompleter).tgt
-                elif range == PLUS:
-                    symbol = self._targetGrammar.plus(None, namedSymbol).setAutocompleter(autocompleter).tgt
-                elif range == OPTIONAL:
-                    symbol = self._targetGrammar.optional(None, namedSymbol).setAutocompleter(autocompleter).tgt
-                else:
-                    symbol = self._targetGrammar.repeat(None, namedSymbol, rfrom=range.lower, rto=range.upper)\
-                        .setAutocompleter(autocompleter).tgt
-                namedSymbol = cast(NonTerminal, symbol).withName(variableName)
+                namedSymbol = Parser.current().quantify(namedSymbol, cast(Range, quantifierObject), autocompleter)
 
             return namedSymbol
 
@@ -380,7 +686,7 @@ class Parser:
                 else:
                     hasWS = child.numChildren() > 0
                     if hasWS:
-                        rhsList.append(self._targetGrammar.WHITESPACE_PLUS.withName("ws+"))
+                        rhsList.append(Parser.current().targetGrammar.WHITESPACE_PLUS.withName("ws+"))
             return rhsList
 
         ret.setEvaluator(evaluate)
@@ -402,6 +708,9 @@ class Parser:
     def removeParseStartListener(self, listener: ParseStartListener) -> None:
         self._parseStartListeners.remove(listener)
 
+    def hasParseStartListeners(self) -> bool:
+        return len(self._parseStartListeners) > 0
+
     def fireParsingStarted(self):
         for listener in self._parseStartListeners:
             listener.parsingStarted()
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import time
+
+from nlScript.parser import Parser
+
+
+def benchmarkDefineSentence(n: int = 10000, step: int = 1000):
+    """
+    Registers n sentences and prints the time needed for each block of `step` sentences.
+    The time per block should stay roughly constant, i.e. defining n sentences should cost O(n).
+    """
+    print("benchmarkDefineSentence(" + str(n) + ")")
+    parser = Parser()
+    start = time.perf_counter()
+    last = start
+    for i in range(1, n + 1):
+        parser.defineSentence("Sentence number " + str(i) + " with {x:int} and {y:float}.", None)
+        if i % step == 0:
+            now = time.perf_counter()
+            print("  sentences " + str(i - step + 1) + "-" + str(i) + ": " + "{:.3f}".format(now - last) + " s")
+            last = now
+
+    now = time.perf_counter()
+    parser.compile()
+    print("  compile: " + "{:.3f}".format(time.perf_counter() - now) + " s")
+
+    now = time.perf_counter()
+    parser.parse("Sentence number " + str(n) + " with 3 and 4.5.", None)
+    print("  parse: " + "{:.3f}".format(time.perf_counter() - now) + " s")
+    print("  total: " + "{:.3f}".format(time.perf_counter() - start) + " s")
+
+
+if __name__ == "__main__":
+    benchmarkDefineSentence()
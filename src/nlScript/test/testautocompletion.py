@@ -1,6 +1,9 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, cast
 
-from nlScript.autocompleter import Autocompleter
+from nlScript.autocompleter import Autocompleter, CachingAutocompleter
 from nlScript.core import graphviz
 from nlScript.core.autocompletion import Autocompletion, Purpose
 from nlScript.core.bnf import BNF
@@ -218,6 +221,173 @@ def test10():
     print("autocompletions = " + str([ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions]))
 
 
+def test11():
+    # the value can be parsed in three ways, which all lead to the same frontier
+    calls: List[bool] = []
+
+    def getAutocompletion(pn, justCheck):
+        calls.append(justCheck)
+        return Autocompletion.literal(pn, ["mm", "cm"])
+
+    parser = Parser()
+    parser.defineType("value", "{n:int}")
+    parser.defineType("value", "{n:float}")
+    parser.defineType("value", "{n:digit:+}")
+    parser.defineType("unit", "{u:[a-z]:+}", autocompleter=getAutocompletion)
+    parser.defineSentence("Move by {v:value} {u:unit}.")
+
+    autocompletions: List[Autocompletion] = []
+    parser.parse("Move by 12 ", autocompletions)
+    assertEquals(["mm", "cm"], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+    assertEquals([True, False], calls)
+
+
+def test12():
+    calls: List[bool] = []
+
+    def getAutocompletion(pn, justCheck):
+        calls.append(justCheck)
+        return Autocompletion.literal(pn, ["mm", "cm"])
+
+    parser = Parser()
+    parser.defineType("unit", "{u:[a-z]:+}", autocompleter=getAutocompletion)
+    parser.defineSentence("Move by {n:int} {u:unit}.", None, True)
+    parser.compile()
+    # the autocompletions of the sentence's children are computed when compiling,
+    # except for those with custom autocompleters, which might depend on other data
+    assertEquals(0, calls.count(False))
+
+    for i in range(2):
+        autocompletions: List[Autocompletion] = []
+        parser.parse("", autocompletions)
+        assertEquals(["\n", "Move by ${n} ${u}."], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+        assertEquals(i + 1, calls.count(False))
+
+    # changing the grammar invalidates them
+    parser.undefineType("unit")
+    parser.defineType("unit", "px")
+    autocompletions: List[Autocompletion] = []
+    parser.parse("", autocompletions)
+    assertEquals(["\n", "Move by ${n} px."], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+
+
+def test13():
+    async def fast(pn, justCheck):
+        await asyncio.sleep(0.01)
+        return Autocompletion.literal(pn, ["apple"])
+
+    cancelled: List[bool] = []
+
+    async def slow(pn, justCheck):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return Autocompletion.literal(pn, ["banana"])
+
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def future(pn, justCheck):
+        if justCheck:
+            return Autocompletion.doesAutocomplete(pn)
+        return executor.submit(lambda: Autocompletion.literal(pn, ["cherry"]))
+
+    parser = Parser()
+    parser.defineType("fast", "{v:[a-z]:+}", autocompleter=fast)
+    parser.defineType("slow", "{v:[a-z]:+}", autocompleter=slow)
+    parser.defineType("future", "{v:[a-z]:+}", autocompleter=future)
+    parser.defineSentence("Get {f:fast}.", None)
+    parser.defineSentence("Get {s:slow}.", None)
+    parser.defineSentence("Get {u:future}.", None)
+    parser.autocompletionTimeout = 0.5
+
+    start = time.monotonic()
+    autocompletions: List[Autocompletion] = []
+    parser.parse("Get ", autocompletions)
+    # the slow autocompleter is dropped, the others are returned
+    assertEquals(["apple", "cherry"], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+    assertEquals(True, time.monotonic() - start < 5)
+    time.sleep(0.1)
+    assertEquals([True], cancelled)
+    executor.shutdown()
+
+
+def test14():
+    datasets = ["blobs", "cells"]
+    calls: List[str] = []
+
+    def getAutocompletion(pn, justCheck):
+        if justCheck:
+            return Autocompletion.doesAutocomplete(pn)
+        calls.append(pn.getParsedString())
+        return Autocompletion.literal(pn, datasets)
+
+    def makeParser(autocompleter: CachingAutocompleter) -> Parser:
+        parser = Parser()
+        parser.defineType("dataset", "{d:[a-z]:+}", autocompleter=autocompleter)
+        parser.defineSentence("Open {d:dataset}.", None)
+        return parser
+
+    def complete(text: str) -> List[str]:
+        autocompletions: List[Autocompletion] = []
+        parser.parse(text, autocompletions)
+        return [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions]
+
+    autocompleter = CachingAutocompleter(getAutocompletion, ttl=60, maxSize=2)
+    parser = makeParser(autocompleter)
+
+    assertEquals(["blobs", "cells"], complete("Open "))
+    assertEquals(["blobs", "cells"], complete("Open "))
+    assertEquals([""], calls)
+    assertEquals(1, autocompleter.getCacheHits())
+    assertEquals(1, autocompleter.getCacheMisses())
+
+    # results are cached per entered text, and the least recently used ones are discarded
+    complete("Open b")
+    complete("Open bl")
+    assertEquals(2, autocompleter.getCacheSize())
+    complete("Open ")
+    assertEquals(["", "b", "bl", ""], calls)
+
+    # invalidating picks up changed data
+    datasets.append("nuclei")
+    assertEquals(["blobs", "cells"], complete("Open "))
+    autocompleter.invalidate()
+    assertEquals(["blobs", "cells", "nuclei"], complete("Open "))
+
+    # expired results are recomputed
+    parser = makeParser(CachingAutocompleter(getAutocompletion, ttl=0))
+    nCalls = len(calls)
+    complete("Open c")
+    time.sleep(0.01)
+    complete("Open c")
+    assertEquals(nCalls + 2, len(calls))
+
+
+def test15():
+    datasets = ["alpha", "beta"]
+
+    def getAutocompletion(pn, justCheck):
+        if justCheck:
+            return Autocompletion.doesAutocomplete(pn)
+        return Autocompletion.literal(pn, datasets)
+
+    parser = Parser()
+    parser.defineType("dataset", "{d:[a-z]:+}", autocompleter=getAutocompletion)
+    parser.defineSentence("Open {d:dataset} now.", None, True)
+
+    autocompletions: List[Autocompletion] = []
+    parser.parse("", autocompletions)
+    assertEquals(["\n", "Open ${d} now."], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+
+    # the entire-sequence completion follows changes of the data source
+    datasets[:] = ["gamma"]
+    autocompletions = []
+    parser.parse("", autocompletions)
+    assertEquals(["\n", "Open gamma now."], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+
+
 def test(inp: str, expectedCompletion: List[str]) -> None:
     print("Testing " + inp)
     grammar = makeGrammar()
@@ -262,6 +432,11 @@ def makeGrammar() -> BNF:
 
 
 if __name__ == "__main__":
+    test15()
+    test14()
+    test13()
+    test12()
+    test11()
     test10()
     test09()
     test08()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+from typing import List
+
+from nlScript.autocompleter import PathAutocompleter
+from nlScript.core.autocompletion import Autocompletion, Purpose
+from nlScript.parser import Parser
+from nlScript.util.completepath import CompletePath
+from nlScript.util.pathprefetcher import PathPrefetcher
+
+
+def assertEquals(exp, real):
+    if exp != real:
+        raise Exception("Expected " + str(exp) + ", but got " + str(real))
+
+
+def touch(path: str) -> None:
+    with open(path, "w"):
+        pass
+
+
+def testFilesystemCache():
+    print("testFilesystemCache")
+    directory = tempfile.mkdtemp()
+    maxCacheSize = CompletePath.getMaxCacheSize()
+    try:
+        CompletePath.clearFilesystemCache()
+        touch(os.path.join(directory, "a.txt"))
+        listing = CompletePath.listDirectory(directory)
+        assertEquals([os.path.join(directory, "a.txt")], [w.path for w in listing])
+        assertEquals(listing, CompletePath.listDirectory(directory))
+        assertEquals(1, CompletePath.getCacheHits())
+        assertEquals(1, CompletePath.getCacheMisses())
+
+        # adding a file changes the modification time of the directory, which invalidates the entry
+        touch(os.path.join(directory, "b.txt"))
+        stat = os.stat(directory)
+        os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        assertEquals(2, len(CompletePath.listDirectory(directory)))
+        assertEquals(2, CompletePath.getCacheMisses())
+
+        CompletePath.invalidate(directory)
+        assertEquals(0, CompletePath.getCacheSize())
+
+        # the least recently used directories are discarded first
+        subdirs = [os.path.join(directory, str(i)) for i in range(3)]
+        for subdir in subdirs:
+            os.mkdir(subdir)
+        CompletePath.setMaxCacheSize(2)
+        for subdir in subdirs:
+            CompletePath.listDirectory(subdir)
+        assertEquals(2, CompletePath.getCacheSize())
+        misses = CompletePath.getCacheMisses()
+        CompletePath.listDirectory(subdirs[2])
+        assertEquals(misses, CompletePath.getCacheMisses())
+        CompletePath.listDirectory(subdirs[0])
+        assertEquals(misses + 1, CompletePath.getCacheMisses())
+    finally:
+        CompletePath.setMaxCacheSize(maxCacheSize)
+        CompletePath.clearFilesystemCache()
+        shutil.rmtree(directory)
+
+
+def testCompletion():
+    print("testCompletion")
+    directory = tempfile.mkdtemp()
+    try:
+        for name in ["b.txt", "a.txt", ".hidden", "B.png"]:
+            touch(os.path.join(directory, name))
+        os.mkdir(os.path.join(directory, "c"))
+        prefix = directory + os.path.sep
+
+        expected = [prefix + "c" + os.path.sep, prefix + "B.png", prefix + "a.txt", prefix + "b.txt", prefix + ".hidden"]
+        assertEquals(expected, CompletePath.getCompletion(prefix))
+        assertEquals([prefix + "B.png", prefix + "b.txt"], CompletePath.getCompletion(prefix + "b"))
+
+        # the entries can be requested page by page
+        assertEquals(expected[:2], CompletePath.getCompletion(prefix, 2))
+        assertEquals(expected[2:4], CompletePath.getCompletion(prefix, 2, 2))
+        assertEquals(expected[4:], CompletePath.getCompletion(prefix, 2, 4))
+        assertEquals([], CompletePath.getCompletion(prefix, 2, 6))
+
+        assertEquals([prefix + "x"], CompletePath.getCompletion(prefix + "x"))
+    finally:
+        CompletePath.clearFilesystemCache()
+        shutil.rmtree(directory)
+
+
+def testPrefetch():
+    print("testPrefetch")
+    directory = tempfile.mkdtemp()
+    prefetcher = PathPrefetcher(nThreads=1, maxPending=2, maxSubdirectories=2)
+    try:
+        CompletePath.clearFilesystemCache()
+        subdirs = [os.path.join(directory, str(i)) for i in range(3)]
+        for subdir in subdirs:
+            os.mkdir(subdir)
+        prefix = directory + os.path.sep
+
+        completions = CompletePath.getCompletion(prefix)
+        prefetcher.prefetchSubdirectories(completions)
+        prefetcher.shutdown(wait=True)
+        misses = CompletePath.getCacheMisses()
+        # the first two subdirectories were listed in the background
+        CompletePath.listDirectory(subdirs[0])
+        CompletePath.listDirectory(subdirs[1])
+        assertEquals(misses, CompletePath.getCacheMisses())
+        CompletePath.listDirectory(subdirs[2])
+        assertEquals(misses + 1, CompletePath.getCacheMisses())
+        assertEquals([], prefetcher.getPending())
+        assertEquals(None, prefetcher.prefetch(directory))
+    finally:
+        prefetcher.shutdown()
+        CompletePath.clearFilesystemCache()
+        shutil.rmtree(directory)
+
+
+def testPrefetchWhileTyping():
+    print("testPrefetchWhileTyping")
+    directory = tempfile.mkdtemp()
+    prefetcher = PathPrefetcher(nThreads=1)
+    try:
+        CompletePath.clearFilesystemCache()
+        for name in ["a", "b"]:
+            os.mkdir(os.path.join(directory, name))
+            touch(os.path.join(directory, name, name + ".txt"))
+        prefix = directory + os.path.sep
+
+        parser = Parser()
+        parser.defineType("folder", "{p:[^.]:+}", autocompleter=PathAutocompleter(prefetcher=prefetcher))
+        parser.defineSentence("Open {f:folder}.", None)
+
+        def complete(text: str) -> List[str]:
+            autocompletions: List[Autocompletion] = []
+            parser.parse(text, autocompletions)
+            return [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions]
+
+        assertEquals([prefix + "a" + os.path.sep, prefix + "b" + os.path.sep, "."], complete("Open " + prefix))
+        prefetcher.waitFor(prefix + "a")
+        prefetcher.waitFor(prefix + "b")
+        # the directory was listed once, and its subdirectories in the background
+        assertEquals(3, CompletePath.getCacheMisses())
+        assertEquals(0, CompletePath.getCacheHits())
+
+        subdir = prefix + "a" + os.path.sep
+        assertEquals([subdir + "a.txt", "."], complete("Open " + subdir))
+        # the subdirectory is taken from the prefetched entry, instead of being listed again
+        assertEquals(3, CompletePath.getCacheMisses())
+        assertEquals(1, CompletePath.getCacheHits())
+    finally:
+        prefetcher.shutdown()
+        CompletePath.clearFilesystemCache()
+        shutil.rmtree(directory)
+
+
+def testCancelWhileListing():
+    print("testCancelWhileListing")
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowPrefetcher(PathPrefetcher):
+        @staticmethod
+        def list(directory: str) -> None:
+            started.set()
+            release.wait()
+
+    prefetcher = SlowPrefetcher(nThreads=1)
+    try:
+        prefetcher.prefetch("/a")
+        started.wait()
+        prefetcher.prefetch("/b")
+        prefetcher.cancel()
+        # the listing in progress is not cancelled, and can still be waited for
+        assertEquals(["/a"], prefetcher.getPending())
+        assertEquals(False, prefetcher.waitFor("/a", timeout=0.01))
+        release.set()
+        assertEquals(True, prefetcher.waitFor("/a", timeout=5))
+        assertEquals(True, prefetcher.waitFor("/b"))
+    finally:
+        release.set()
+        prefetcher.shutdown()
+
+
+if __name__ == "__main__":
+    testFilesystemCache()
+    testCompletion()
+    testPrefetch()
+    testPrefetchWhileTyping()
+    testCancelWhileListing()
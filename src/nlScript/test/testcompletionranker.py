@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import List
+
+from nlScript.completionranker import CompletionRanker
+from nlScript.core.autocompletion import Autocompletion, Purpose
+from nlScript.parser import Parser
+
+
+def assertEquals(exp, real):
+    if exp != real:
+        raise Exception("Expected " + str(exp) + ", but got " + str(real))
+
+
+DATASETS = ["blobs", "Cells", "cells2", "Centers", "nuclei", "cellsDAPI"]
+
+
+def getCompletions(text: str) -> List[Autocompletion]:
+    def getAutocompletion(pn, justCheck):
+        if justCheck:
+            return Autocompletion.doesAutocomplete(pn)
+        return Autocompletion.literal(pn, DATASETS)
+
+    parser = Parser()
+    parser.defineType("dataset", "{d:[a-zA-Z0-9]:+}", autocompleter=getAutocompletion)
+    parser.defineSentence("Open {d:dataset}.", None)
+    autocompletions: List[Autocompletion] = []
+    parser.parse(text, autocompletions)
+    return autocompletions
+
+
+def getCompletionStrings(autocompletions: List[Autocompletion]) -> List[str]:
+    return [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions]
+
+
+def testRanking():
+    print("testRanking")
+    ranker = CompletionRanker()
+    autocompletions = getCompletions("Open ce")
+    # prefix matches first (the "." after the complete name has no prefix), case-sensitive ones before case-insensitive ones
+    assertEquals(["cells2", "cellsDAPI", ".", "Cells", "Centers", "blobs", "nuclei"], getCompletionStrings(ranker.rank(autocompletions)))
+
+    # then the ones which were used more often
+    ranker.recordUsage(autocompletions[5])
+    ranker.recordUsage(autocompletions[1])
+    ranker.recordUsage(autocompletions[5])
+    assertEquals(2, ranker.getUsageCount(autocompletions[5]))
+    assertEquals(["cellsDAPI", "cells2", ".", "Cells", "Centers", "blobs", "nuclei"], getCompletionStrings(ranker.rank(autocompletions)))
+
+
+def testPaging():
+    print("testPaging")
+    ranker = CompletionRanker(maxResults=4)
+    autocompletions = getCompletions("Open ce")
+    expected = getCompletionStrings(ranker.rank(autocompletions))
+
+    page = ranker.getPage(autocompletions)
+    assertEquals(expected[:4], getCompletionStrings(page.autocompletions))
+    assertEquals(True, page.hasMore())
+
+    page = ranker.getNextPage(page.continuationToken)
+    assertEquals(expected[4:], getCompletionStrings(page.autocompletions))
+    assertEquals(False, page.hasMore())
+
+    ranker.maxResults = None
+    assertEquals(expected, getCompletionStrings(ranker.getPage(autocompletions).autocompletions))
+
+
+def testDeduplication():
+    print("testDeduplication")
+    global DATASETS
+    datasets = DATASETS
+    try:
+        DATASETS = ["blobs", "cells", "blobs", "cells", "nuclei"]
+        assertEquals(["blobs", "cells", "nuclei"], getCompletionStrings(getCompletions("Open ")))
+    finally:
+        DATASETS = datasets
+
+
+if __name__ == "__main__":
+    testRanking()
+    testPaging()
+    testDeduplication()
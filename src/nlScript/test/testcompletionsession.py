@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from typing import List
+
+from nlScript.completionsession import CompletionSession
+from nlScript.core.autocompletion import Autocompletion, Purpose
+from nlScript.core.terminal import literal
+from nlScript.ebnf.ebnfparser import ParseStartListener
+from nlScript.parseexception import ParseException
+from nlScript.parser import Parser
+from nlScript.util import range as Range
+
+
+def assertEquals(exp, real):
+    if exp != real:
+        raise Exception("Expected " + str(exp) + ", but got " + str(real))
+
+
+def makeParser() -> Parser:
+    parser = Parser()
+    parser.defineType("fruit", "apple", None)
+    parser.defineSentence("Eat {n:int} {f:list<fruit>}.", None)
+    parser.defineSentence("Paint {c:color}.", None)
+    return parser
+
+
+def getCompletionStrings(autocompletions: List[Autocompletion]) -> List[str]:
+    return [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions]
+
+
+SCRIPT = "Eat 1 apple.\nEat 2 apple, apple.\n\nPaint red.\n"
+
+
+def testTyping():
+    print("testTyping")
+    parser = makeParser()
+    session = CompletionSession(parser)
+    line = "Paint re"
+    for i in range(len(line) + 1):
+        text = SCRIPT + line[:i]
+        expected: List[Autocompletion] = []
+        parser.parse(text, expected)
+        assertEquals(getCompletionStrings(expected), getCompletionStrings(session.autocomplete(text)))
+        # after the first call, only the last line is parsed
+        assertEquals(0 if i == 0 else len(SCRIPT), session.getOffset())
+    assertEquals([13, 33, 45], session.getCheckpoints())
+
+
+def testEditing():
+    print("testEditing")
+    parser = makeParser()
+    session = CompletionSession(parser)
+    session.autocomplete(SCRIPT + "Eat 3 ")
+
+    # changing the second sentence invalidates the checkpoints after the first one
+    text = SCRIPT.replace("Eat 2", "Eat 23") + "Eat 3 "
+    assertEquals(["apple", "."], getCompletionStrings(session.autocomplete(text)))
+    assertEquals([13, 34, 46], session.getCheckpoints())
+
+    # errors are reported for the entire text
+    text = SCRIPT.replace("Paint red", "Paint rot") + "Eat 3 "
+    try:
+        session.autocomplete(text)
+        raise Exception("Expected a ParseException")
+    except ParseException as e:
+        assertEquals(text.index("rot"), e.getFirstAutocompletingAncestorThatFailed().matcher.pos)
+    assertEquals([], session.getCheckpoints())
+
+
+def testListeners():
+    print("testListeners")
+    parser = makeParser()
+    nStarted = 0
+
+    def parsingStarted():
+        nonlocal nStarted
+        nStarted += 1
+
+    parser.addParseStartListener(ParseStartListener(parsingStarted))
+    session = CompletionSession(parser)
+    session.autocomplete(SCRIPT)
+    nStartedBefore = nStarted
+    session.autocomplete(SCRIPT + "Eat 3 ")
+    # the entire text needs to be parsed for the listener
+    assertEquals(0, session.getOffset())
+    assertEquals(True, nStarted > nStartedBefore)
+
+
+def countParses(parser: Parser) -> List[int]:
+    nParses = [0]
+    parse = parser.parse
+
+    def countingParse(*args, **kwargs):
+        nParses[0] += 1
+        return parse(*args, **kwargs)
+
+    parser.parse = countingParse
+    return nParses
+
+
+def assertParseException(session: CompletionSession, text: str):
+    try:
+        session.autocomplete(text)
+        raise Exception("Expected a ParseException")
+    except ParseException:
+        pass
+
+
+def testSyntaxError():
+    print("testSyntaxError")
+    parser = makeParser()
+    session = CompletionSession(parser)
+    nParses = countParses(parser)
+    session.autocomplete(SCRIPT + "Paint r")
+
+    # the keystroke which introduces the error parses from the checkpoint and then the entire text
+    nParses[0] = 0
+    assertParseException(session, SCRIPT + "Paint rx")
+    assertEquals(2, nParses[0])
+
+    # further keystrokes only parse the entire text, until the error is fixed
+    nParses[0] = 0
+    assertParseException(session, SCRIPT + "Paint rxy")
+    assertEquals(1, nParses[0])
+    assertEquals(["red"], getCompletionStrings(session.autocomplete(SCRIPT + "Paint r")))
+
+
+def testCustomTopLevelSymbol():
+    print("testCustomTopLevelSymbol")
+    parser = makeParser()
+    grammar = parser.targetGrammar
+    fruits = grammar.join(None, grammar.getSymbol("fruit").withName("fruit"), None, None, literal("\n"), cardinality=Range.STAR)
+    basket = grammar.sequence("basket", [literal("Basket:").withName(), literal("\n").withName(), fruits.withName("fruits")])
+    parser.compile(basket.tgt)
+
+    session = CompletionSession(parser)
+    nParses = countParses(parser)
+    assertEquals(["apple"], getCompletionStrings(session.autocomplete("Basket:\napple\n")))
+    assertEquals(["apple"], getCompletionStrings(session.autocomplete("Basket:\napple\nap")))
+    # the children of 'basket' are not sentences, so the text is always parsed entirely, and only once
+    assertEquals([], session.getCheckpoints())
+    assertEquals(0, session.getOffset())
+    assertEquals(2, nParses[0])
+
+
+if __name__ == "__main__":
+    testTyping()
+    testEditing()
+    testListeners()
+    testSyntaxError()
+    testCustomTopLevelSymbol()
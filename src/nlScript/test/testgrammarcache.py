@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import tempfile
+
+from nlScript.grammarcache import GrammarCache
+from nlScript.parser import Parser
+
+
+def assertEquals(exp, real):
+    if exp != real:
+        raise Exception("Expected " + str(exp) + ", but got " + str(real))
+
+
+PATTERNS = [
+    "Eat {f:list<fruit>:2-4} at {t:time}.",
+    "Cut {t:tuple<int,x,y>:?} into {p:[0-9]:3-5} pieces.",
+    "Say {w:+} {n:int:*}."
+]
+
+TEXT = "Eat apple 1, apple 2 at 12:30.\n" \
+       "Cut (1, 2) into 123 pieces.\n" \
+       "Say www 1."
+
+
+def makeParser(cache: GrammarCache or None, patterns=None) -> Parser:
+    hlp = Parser()
+    hlp.grammarCache = cache
+    hlp.defineType("fruit", "apple {n:int}", lambda pn: pn.evaluate("n"))
+    for pattern in PATTERNS if patterns is None else patterns:
+        hlp.defineSentence(pattern, lambda pn: pn.getParsedString())
+    hlp.compile()
+    return hlp
+
+
+def testRoundTrip():
+    print("testRoundTrip")
+    directory = tempfile.mkdtemp()
+    try:
+        expected = makeParser(None).parse(TEXT).evaluate()
+
+        cache = GrammarCache(directory)
+        assertEquals(expected, makeParser(cache).parse(TEXT).evaluate())
+        assertEquals(True, os.path.exists(cache.path))
+        assertEquals(len(PATTERNS) + 1, len(cache.getEntries()))
+
+        # a new cache instance reads the file, and all patterns are found there
+        cache = GrammarCache(directory)
+        assertEquals(expected, makeParser(cache).parse(TEXT).evaluate())
+        assertEquals(False, cache.isModified())
+
+        # changing a definition results in a new entry
+        cache = GrammarCache(directory)
+        makeParser(cache, PATTERNS + ["Say {w:+} {n:int:*} again."])
+        assertEquals(len(PATTERNS) + 2, len(cache.getEntries()))
+    finally:
+        shutil.rmtree(directory)
+
+
+def testInvalidFile():
+    print("testInvalidFile")
+    directory = tempfile.mkdtemp()
+    try:
+        cache = GrammarCache(directory)
+        with open(cache.path, "w") as f:
+            f.write("{ not json")
+        assertEquals(0, len(cache.getEntries()))
+        makeParser(cache)
+        assertEquals(len(PATTERNS) + 1, len(GrammarCache(directory).getEntries()))
+    finally:
+        shutil.rmtree(directory)
+
+
+def testMalformedEntries():
+    print("testMalformedEntries")
+    directory = tempfile.mkdtemp()
+    warnings = []
+
+    class WarningHandler(logging.Handler):
+        def emit(self, record: logging.LogRecord) -> None:
+            warnings.append(record)
+
+    handler = WarningHandler(logging.WARNING)
+    logging.getLogger("nlScript.parser").addHandler(handler)
+    try:
+        expected = makeParser(None).parse(TEXT).evaluate()
+        malformed = [[["x", ["type", "unknown-type"]]], [["x", ["bogus", ["literal", "x"], "n"]]], [["x"]], [42]]
+        for entry in malformed:
+            cache = GrammarCache(directory)
+            makeParser(cache)
+            for fingerprint in cache.getEntries():
+                cache.getEntries()[fingerprint] = entry
+            # entries which cannot be decoded are translated again, without a warning
+            assertEquals(expected, makeParser(cache).parse(TEXT).evaluate())
+        assertEquals([], warnings)
+    finally:
+        logging.getLogger("nlScript.parser").removeHandler(handler)
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    testRoundTrip()
+    testInvalidFile()
+    testMalformedEntries()
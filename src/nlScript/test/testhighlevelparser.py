@@ -1,6 +1,11 @@
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import cast, List
 
-from nlScript.core import graphviz
+from nlScript.core import graphviz, terminal
+from nlScript.core.autocompletion import Autocompletion, Purpose
 from nlScript.core.bnf import BNF
 from nlScript.core.lexer import Lexer
 from nlScript.core.named import Named
@@ -8,7 +13,7 @@ from nlScript.core.nonterminal import NonTerminal
 from nlScript.core.parsingstate import ParsingState
 from nlScript.core.rdparser import RDParser
 from nlScript.core.symbol import Symbol
-from nlScript.core.terminal import characterClass, Literal, Terminal, CharacterClass, DIGIT
+from nlScript.core.terminal import characterClass, literal, Literal, Terminal, CharacterClass, DIGIT
 from nlScript.ebnf import ebnfparsednodefactory
 from nlScript.ebnf.ebnf import EBNF
 from nlScript.ebnf.join import Join
@@ -92,7 +97,7 @@ def evaluateHighlevelParser(hlp: Parser, input: str) -> object:
     p = parser.parse()
     if p.matcher.state is not ParsingState.SUCCESSFUL:
         raise Exception("Parsing failed")
-    return p.evaluate()
+    return hlp.evaluatePattern(p)
 
 
 def testList():
@@ -375,6 +380,313 @@ def testDefineType():
     pn.evaluate()
 
 
+def testMemoizeEvaluation():
+    nCalls = {"digit": 0, "sentence": 0}
+
+    def evaluateDigit(pn: ParsedNode) -> object:
+        nCalls["digit"] += 1
+        return int(pn.getParsedString())
+
+    def evaluateSentence(pn: ParsedNode) -> object:
+        nCalls["sentence"] += 1
+        return pn.evaluate("d") + pn.evaluate("d")
+
+    hlp = Parser()
+    hlp.memoizeEvaluation = True
+    hlp.defineType("my-digit", "{d:digit}", evaluateDigit)
+    sentence = hlp.defineSentence("Digit {d:my-digit}.", evaluateSentence)
+    sentence.setMemoizable(False)
+
+    root = hlp.parse("Digit 3.", None)
+    assertEquals([6], root.evaluate())
+    assertEquals([6], root.evaluate())
+    # the digit is memoized, the sentence is not
+    assertEquals(1, nCalls["digit"])
+    assertEquals(2, nCalls["sentence"])
+
+    digit = root.getChild(0).getChild(0).getChild("d")
+    digit.invalidateEvaluation()
+    assertEquals(6, digit.parent.evaluate())
+    assertEquals(2, nCalls["digit"])
+
+
+def testMemoizeConcurrentEvaluation():
+    print("testMemoizeConcurrentEvaluation")
+    nCalls = {"slow": 0}
+    started = threading.Event()
+    release = threading.Event()
+
+    def evaluateSlow(pn: ParsedNode) -> object:
+        nCalls["slow"] += 1
+        started.set()
+        release.wait()
+        return pn.evaluate("d")
+
+    hlp = Parser()
+    hlp.memoizeEvaluation = True
+    hlp.defineSentence("Digit {d:digit}.", lambda pn: pn.evaluate("d")).setMemoizable(False)
+    hlp.defineSentence("Slow {d:digit}.", evaluateSlow)
+
+    slow = hlp.parse("Slow 4.", None)
+    thread = threading.Thread(target=slow.evaluate)
+    thread.start()
+    started.wait()
+    # evaluating a non-memoizable rule meanwhile does not keep the other evaluation from being memoized
+    assertEquals(["3"], hlp.parse("Digit 3.", None).evaluate())
+    release.set()
+    thread.join()
+    assertEquals(["4"], slow.evaluate())
+    assertEquals(1, nCalls["slow"])
+
+
+def testPatternCache():
+    hlp = Parser()
+    rule1 = hlp.defineSentence("Wait for {t:int:*} minutes.", None)
+    rule2 = hlp.defineSentence("Wait for {t:int:*} minutes.", None)
+    # the helper rule for the quantifier is shared
+    assertEquals(rule1.get().children[4], rule2.get().children[4])
+
+    hlp.defineType("color", "red", lambda pn: "red")
+    rule3 = hlp.defineSentence("Paint {c:color}.", None)
+    hlp.undefineType("color")
+    rule4 = hlp.defineSentence("Paint {c:color}.", None)
+    assertEquals(rule3.get().children, rule4.get().children)
+
+    rules = hlp.defineSentences([
+        "Close.",
+        ("Add {a:int} and {b:int}.", lambda pn: pn.evaluate("a") + pn.evaluate("b"))
+    ])
+    assertEquals(2, len(rules))
+    assertEquals([7], hlp.parse("Add 3 and 4.", None).evaluate())
+
+
+def testSharedMetaGrammar():
+    hlp1 = Parser()
+    hlp2 = Parser()
+    assertEquals(hlp1.EXPRESSION, hlp2.EXPRESSION)
+    assertEquals(True, Parser.metaGrammar.isFrozen())
+    assertEquals(False, hlp1.grammar.isFrozen())
+
+    # hlp2 was created last, but the pattern must extend the target grammar of hlp1
+    hlp1.defineSentence("Wait for {t:int:*} minutes.", None)
+    tgt = hlp1.defineSentence("Count {l:list<int>}.", None).get().children[2]
+    assertEquals(1, len(hlp1.targetGrammar.getRules(tgt)))
+    assertEquals(0, len(hlp2.targetGrammar.getRules(tgt)))
+    assertEquals(ParsingState.SUCCESSFUL, hlp1.parse("Count 1, 2.", None).matcher.state)
+
+    # outside of evaluatePattern(), it is undefined which target grammar to extend
+    pn = RDParser(Parser.metaGrammar.getBNF(), Lexer("{l:list<int>}"), ebnfparsednodefactory.INSTANCE).parse()
+    try:
+        pn.evaluate()
+        raise Exception("Expected an exception")
+    except Exception as e:
+        assertEquals("No Parser to evaluate the meta-grammar for", str(e))
+    assertEquals(1, len(hlp2.evaluatePattern(pn)))
+
+    try:
+        Parser.metaGrammar.removeRules(hlp1.EXPRESSION.tgt)
+        raise Exception("Expected an exception")
+    except Exception as e:
+        assertEquals("Cannot remove rules from a frozen grammar", str(e))
+
+
+def testBuildMetaGrammarConcurrently():
+    print("testBuildMetaGrammarConcurrently")
+    metaGrammar, metaRules, buildMetaGrammar = Parser.metaGrammar, Parser.metaRules, Parser.buildMetaGrammar
+    nBuilt = 0
+
+    def countingBuildMetaGrammar(self):
+        nonlocal nBuilt
+        nBuilt += 1
+        # give the other threads time to find the meta-grammar missing, too
+        time.sleep(0.05)
+        buildMetaGrammar(self)
+
+    Parser.metaGrammar = None
+    Parser.buildMetaGrammar = countingBuildMetaGrammar
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            parsers = list(executor.map(lambda _: Parser(), range(8)))
+        # the meta-grammar is built once, and all Parsers use the same rules
+        assertEquals(1, nBuilt)
+        for hlp in parsers:
+            assertEquals(True, hlp.EXPRESSION is Parser.metaRules["EXPRESSION"])
+    finally:
+        Parser.metaGrammar, Parser.metaRules, Parser.buildMetaGrammar = metaGrammar, metaRules, buildMetaGrammar
+
+
+def testSharedTerminals():
+    print("testSharedTerminals")
+    parser = Parser()
+    parser.defineSentence("Frobnicate the quuxle.", None)
+    parser.compile()
+    assertEquals(True, literal("Frobnicate the quuxle.") is literal("Frobnicate the quuxle."))
+    assertEquals(True, "Frobnicate the quuxle." in terminal.LITERALS)
+
+    # terminals which are not used by any grammar anymore are released
+    del parser
+    gc.collect()
+    assertEquals(False, "Frobnicate the quuxle." in terminal.LITERALS)
+
+
+def testSharedHelperRules():
+    assertEquals(True, literal("a") is literal("a"))
+    assertEquals(True, characterClass("[a-z]") is characterClass("[a-z]"))
+
+    hlp = Parser()
+    integer = hlp.targetGrammar.INTEGER.withName("int")
+    nRules = len(hlp.targetGrammar.rules)
+    hlp.targetGrammar.list(None, integer)
+    hlp.targetGrammar.list(None, integer)
+    # two joins, plus the delimiter and its whitespace, which are shared
+    assertEquals(nRules + 2 + 2, len(hlp.targetGrammar.rules))
+
+    hlp.targetGrammar.WHITESPACE_PLUS.withName()
+    nRules = len(hlp.targetGrammar.rules)
+    hlp.defineSentence("Sum {a:tuple<int,x,y>}.", lambda pn: sum(pn.evaluate("a")))
+    hlp.defineSentence("Add {a:tuple<int,x,y>} and {b:tuple<int,x,y,z>}.", None)
+    # two sentences and three tuples, plus a single set of shared open, close, delimiter and whitespace rules
+    assertEquals(nRules + 2 + 3 + 4, len(hlp.targetGrammar.rules))
+    assertEquals([3], hlp.parse("Sum (1, 2).", None).evaluate())
+
+
+def testCompaction():
+    hlp = Parser()
+
+    def define(i: int):
+        hlp.defineType("fruit", "apple {n:int:*} {w:list<float>} {s:tuple<int,x,y>} " + str(i))
+
+    def redefine(i: int):
+        hlp.undefineType("fruit")
+        define(i)
+        return hlp.compile()
+
+    define(0)
+    hlp.defineSentence("Buy {f:fruit:+}.", None)
+    hlp.compile()
+    sizes = (len(hlp.targetGrammar.rules), hlp.targetGrammar.getBNF().numProductions())
+    for i in range(1, 5):
+        statistics = redefine(i)
+        # the star, list and tuple of the previous definition are removed; the shared list and tuple helpers are kept
+        assertEquals(3, statistics.getRemovedRules())
+        assertEquals(sizes, (statistics.rulesAfter, statistics.productionsAfter))
+        assertEquals(True, statistics.symbolsAfter < statistics.symbolsBefore)
+
+    assertEquals(ParsingState.SUCCESSFUL, hlp.parse("Buy apple 1 2.5 (1, 2) 4.", None).matcher.state)
+
+
+def testIncrementalCompile():
+    hlp = Parser()
+    hlp.defineType("fruit", "apple {n:int:*}")
+    for i in range(20):
+        hlp.defineSentence("Eat " + str(i) + " {f:fruit}.", None)
+    hlp.compile()
+    assertEquals([], hlp.targetGrammar.getChangedSymbols())
+
+    rule = hlp.defineSentence("Eat {f:fruit:+}.", None).get()
+    changed = hlp.targetGrammar.getChangedSymbols()
+    # only the new sentence and its helper rule are logged
+    assertEquals([rule.children[2].symbol, "sentence"], changed)
+    assertEquals(0, hlp.compile().getRemovedRules())
+
+    # undefining 'fruit' removes its helper star, but not the helper of the sentence, which still references 'fruit'
+    hlp.undefineType("fruit")
+    assertEquals(1, hlp.compile().getRemovedRules())
+    assertEquals(0, hlp.targetGrammar.compact(full=True).getRemovedRules())
+
+
+def testDerive():
+    base = Parser()
+    base.defineType("fruit", "apple", lambda pn: "apple")
+    base.defineSentence("Eat {f:list<fruit>}.", lambda pn: pn.evaluate("f"))
+    base.compile()
+    nRules = base.targetGrammar.numRules()
+
+    tenant1 = base.derive()
+    assertEquals(True, base.targetGrammar.isFrozen())
+    assertEquals(nRules, tenant1.targetGrammar.numRules())
+    tenant1.defineSentence("Paint {c:color}.", lambda pn: pn.evaluate("c"))
+    assertEquals([["apple", "apple"], EBNF.rgb2int(255, 0, 0)], tenant1.parse("Eat apple, apple.\nPaint red.").evaluate())
+
+    tenant2 = base.derive()
+    tenant2.undefineType("fruit")
+    tenant2.defineType("fruit", "pear", lambda pn: "pear")
+    assertEquals([["pear"]], tenant2.parse("Eat pear.").evaluate())
+
+    # the base and the other tenant are not affected
+    assertEquals([["apple"]], base.parse("Eat apple.").evaluate())
+    for parser, text in [(base, "Paint red."), (tenant2, "Eat apple.")]:
+        try:
+            parser.parse(text)
+            raise Exception("Expected a ParseException for " + text)
+        except ParseException:
+            pass
+    assertEquals(nRules, base.targetGrammar.numRules())
+
+    # the productions returned for an inherited symbol are a copy, which does not change the base
+    fruit = cast(NonTerminal, base.targetGrammar.getSymbol("fruit"))
+    productions = tenant1.targetGrammar.getBNF().getProductions(fruit)
+    productions.clear()
+    assertEquals(1, len(base.targetGrammar.getBNF().getProductions(fruit)))
+    assertEquals(1, len(tenant1.targetGrammar.getBNF().getProductions(fruit)))
+
+    try:
+        base.defineSentence("Drink {f:fruit}.", None)
+        raise Exception("Expected an exception, because the base is frozen")
+    except Exception as e:
+        assertEquals("Cannot add rules to a frozen grammar", str(e))
+
+
+def testDeriveAutocompletion():
+    print("testDeriveAutocompletion")
+    base = Parser()
+    base.defineType("unit", "mm", None, True)
+    base.defineSentence("Set {u:unit}.", None, True)
+
+    tenant = base.derive()
+    tenant.undefineType("unit")
+    tenant.defineType("unit", "cm", None, True)
+
+    # the inherited sentence is completed with the tenant's grammar
+    autocompletions: List[Autocompletion] = []
+    tenant.parse("", autocompletions)
+    assertEquals(["\n", "Set cm."], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+    assertEquals(ParsingState.SUCCESSFUL, tenant.parse("Set cm.").matcher.state)
+
+    autocompletions = []
+    base.parse("", autocompletions)
+    assertEquals(["\n", "Set mm."], [ac.getCompletion(Purpose.FOR_INSERTION) for ac in autocompletions])
+
+
+def testErrorMessage():
+    print("testErrorMessage")
+    hlp = Parser()
+    hlp.defineSentence("Paint {c:color}.", None)
+    hlp.defineSentence("Eat {n:int} apples.", None)
+    text = "Eat 1 apples.\n\nPaint blue!"
+    try:
+        hlp.parse(text, None)
+        raise Exception("Expected a ParseException")
+    except ParseException as e:
+        assertEquals(
+            "Error at position 25 in line 2:\n"
+            "Paint blue!\n"
+            "          ^\n"
+            "Expected ['.']", e.getError())
+
+    # an error at a line break points to the end of the line
+    text = "Eat 1 apples.\nPaint blue\nEat 2 apples."
+    try:
+        hlp.parse(text, None)
+        raise Exception("Expected a ParseException")
+    except ParseException as e:
+        assertEquals(
+            "Error at position 24 in line 1:\n"
+            "Paint blue\n"
+            "         ^\n"
+            "Expected ['.']", e.getError())
+
+
 if __name__ == "__main__":
     testQuantifier()
     testIdentifier()
@@ -386,3 +698,15 @@ if __name__ == "__main__":
     testNoVariable()
     testExpression()
     testDefineType()
+    testMemoizeEvaluation()
+    testMemoizeConcurrentEvaluation()
+    testPatternCache()
+    testSharedMetaGrammar()
+    testBuildMetaGrammarConcurrently()
+    testSharedTerminals()
+    testSharedHelperRules()
+    testCompaction()
+    testIncrementalCompile()
+    testDerive()
+    testDeriveAutocompletion()
+    testErrorMessage()
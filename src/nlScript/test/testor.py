@@ -62,6 +62,23 @@ def testSuccess(input: str):
     assertEquals("seq", child.name)
 
 
+def testNames():
+    grammar = EBNFCore()
+    rule = grammar.orrule("or", [
+        literal("yes").withName("y"),
+        literal("no").withName("n")
+    ])
+    grammar.compile(rule.tgt)
+
+    for idx, (input, name) in enumerate([("yes", "y"), ("no", "n")]):
+        parser = RDParser(grammar.getBNF(), Lexer(input), ebnfparsednodefactory.INSTANCE)
+        root = parser.parse()
+        assertEquals(ParsingState.SUCCESSFUL, root.matcher.state)
+        child = root.getChild(0).getChild(0)
+        assertEquals(name, child.name)
+        assertEquals(idx, child.nthEntryInParent)
+
+
 def testFailure(input: str):
     grammar = makeGrammar()
     lexer = Lexer(input)
@@ -93,8 +110,14 @@ def test4():
     testFailure("s")
 
 
+def test5():
+    print("test5")
+    testNames()
+
+
 if __name__ == "__main__":
     test1()
     test2()
     test3()
     test4()
+    test5()
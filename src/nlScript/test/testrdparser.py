@@ -1,11 +1,15 @@
+import gc
+from typing import List
+
 from nlScript.core import parsednodefactory
 from nlScript.core.bnf import BNF
 from nlScript.core.lexer import Lexer
+from nlScript.core.matcher import Matcher
 from nlScript.core.nonterminal import NonTerminal
 from nlScript.core.parsingstate import ParsingState
 from nlScript.core.production import Production
 from nlScript.core.rdparser import RDParser
-from nlScript.core.terminal import literal, DIGIT
+from nlScript.core.terminal import literal, DIGIT, Digit
 
 
 def assertEquals(exp, real):
@@ -39,5 +43,26 @@ def testParse():
     assertEquals(ParsingState.SUCCESSFUL, parsed.matcher.state)
 
 
+def testSuspendGC():
+    gcEnabledWhileParsing: List[bool] = []
+
+    class CheckingDigit(Digit):
+        def matches(self, lexer: Lexer) -> Matcher:
+            gcEnabledWhileParsing.append(gc.isenabled())
+            return super().matches(lexer)
+
+    bnf = BNF()
+    bnf.addProduction(Production(BNF.ARTIFICIAL_START_SYMBOL, [
+        CheckingDigit(), BNF.ARTIFICIAL_STOP_SYMBOL]))
+
+    parser = RDParser(bnf, Lexer("3"), parsednodefactory.DEFAULT)
+    parser.suspendGC = True
+    parsed = parser.parse()
+    assertEquals(ParsingState.SUCCESSFUL, parsed.matcher.state)
+    assertEquals([False], gcEnabledWhileParsing)
+    assertEquals(True, gc.isenabled())
+
+
 if __name__ == "__main__":
     testParse()
+    testSuspendGC()
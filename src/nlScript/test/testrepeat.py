@@ -11,6 +11,7 @@ from nlScript.ebnf import ebnfparsednodefactory
 from nlScript.ebnf.ebnfcore import EBNFCore
 from nlScript.core import graphviz
 from nlScript.parsednode import ParsedNode
+from nlScript.parser import Parser
 from nlScript.parseexception import ParseException
 
 
@@ -124,9 +125,41 @@ def test5():
     testFailure(g, "s")
 
 
+def test6():
+    print("test6")
+    g = makeGrammar(1, 500)
+    # the repetition is a single production, independent of the upper bound
+    assertEquals(1, len(g.getProductions(g.getSymbol("repeat"))))
+    testFailure(g, "")
+    testSuccess(g, "1a")
+    testSuccess(g, 50 * "1a")
+    testFailure(g, 50 * "1a" + "s")
+    # the entries are not parsed recursively, so the upper bound can be reached
+    testSuccess(g, 500 * "1a")
+    testFailure(g, 501 * "1a")
+
+
+def test7():
+    print("test7")
+    parser = Parser()
+    parser.defineSentence("Digits {d:digit:1-500}.", lambda pn: pn.evaluate("d"))
+    parser.defineSentence("List {l:list<int>}.", lambda pn: pn.evaluate("l"))
+    digits = parser.parse("Digits " + 500 * "1" + ".", None).evaluate()[0]
+    assertEquals(500 * ["1"], digits)
+    try:
+        parser.parse("Digits " + 501 * "1" + ".", None)
+        raise Exception("Expected a ParseException")
+    except ParseException:
+        pass
+    entries = parser.parse("List " + ", ".join(map(str, range(1000))) + ".", None).evaluate()[0]
+    assertEquals(list(range(1000)), entries)
+
+
 if __name__ == "__main__":
     test1()
     test2()
     test3()
     test4()
     test5()
+    test6()
+    test7()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, cast
 
 from nlScript.core.bnf import BNF
@@ -90,8 +91,23 @@ def test4():
     testFailure("s")
 
 
+def testConcurrentParsing():
+    # the continuations of the repetition are created lazily, by whichever parser needs them first
+    grammar = makeGrammar()
+    input = "1a2b3c4d5e6f7g8h9i"
+
+    def parse(_):
+        root = RDParser(grammar, Lexer(input), ebnfparsednodefactory.INSTANCE).parse()
+        return root.children[0].evaluateSelf()
+
+    with ThreadPoolExecutor(8) as executor:
+        for evaluated in executor.map(parse, range(32)):
+            assertEquals([input[i:i + 2] for i in range(0, len(input), 2)], evaluated)
+
+
 if __name__ == "__main__":
     test1()
     test2()
     test3()
     test4()
+    testConcurrentParsing()
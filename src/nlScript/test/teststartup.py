@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+from nlScript.ebnf.ebnf import EBNF
+from nlScript.parser import Parser
+
+
+def assertEquals(exp, real):
+    if exp != real:
+        raise Exception("Expected " + str(exp) + ", but got " + str(real))
+
+
+# generous upper bounds in seconds, meant to catch accidental eager work at import time
+IMPORT_BUDGET = 1.0
+CONSTRUCTION_BUDGET = 0.5
+
+
+def runPython(script: str) -> str:
+    src = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = src + os.pathsep + env.get("PYTHONPATH", "")
+    return subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True).stdout
+
+
+def testImportTime():
+    print("testImportTime")
+    script = \
+        "import sys, time\n" \
+        "before = set(sys.modules)\n" \
+        "t0 = time.perf_counter()\n" \
+        "import nlScript.parser\n" \
+        "t1 = time.perf_counter()\n" \
+        "nlScript.parser.Parser()\n" \
+        "t2 = time.perf_counter()\n" \
+        "print(t1 - t0, t2 - t1, 'PySide2' in set(sys.modules) - before)\n"
+    out = runPython(script)
+    importTime, constructionTime, guiImported = out.split()
+    print("  import: " + importTime + " s, Parser(): " + constructionTime + " s")
+    assertEquals(True, float(importTime) < IMPORT_BUDGET)
+    assertEquals(True, float(constructionTime) < CONSTRUCTION_BUDGET)
+    # the parser must not pull in the UI toolkit
+    assertEquals("False", guiImported)
+
+
+def testLazyBuiltins():
+    print("testLazyBuiltins")
+    grammar = EBNF()
+    assertEquals(0, len(grammar.rules))
+
+    color = grammar.getSymbol(EBNF.COLOR_NAME)
+    assertEquals(EBNF.COLOR_NAME, color.symbol)
+    assertEquals(grammar.COLOR.tgt, color)
+    # color depends on integer, which is therefore created as well
+    assertEquals(True, len(grammar.getRules(grammar.symbols[EBNF.INTEGER_NAME])) > 0)
+    assertEquals(False, EBNF.DATETIME_NAME in grammar.symbols)
+
+    copy = EBNF(grammar)
+    assertEquals(grammar.COLOR, copy.COLOR)
+
+    hlp = Parser()
+    hlp.defineSentence("Paint {c:color}.", lambda pn: pn.evaluate("c"))
+    assertEquals([EBNF.rgb2int(255, 0, 0)], hlp.parse("Paint red.", None).evaluate())
+
+
+def testDeterministicGrammar():
+    print("testDeterministicGrammar")
+    script = \
+        "from nlScript.parser import Parser\n" \
+        "hlp = Parser()\n" \
+        "hlp.defineType('fruit', 'apple{n:int:*}')\n" \
+        "hlp.defineSentence('Eat {f:list<fruit>} at {t:time}.', None)\n" \
+        "hlp.defineSentence('Cut {t:tuple<int,x,y>} into {p:[0-9]:3-5} pieces.', None)\n" \
+        "hlp.compile()\n" \
+        "print(hlp.targetGrammar.getBNF())\n"
+    # string hashing is randomized per process, symbol names must not depend on it
+    first = runPython(script)
+    second = runPython(script)
+    assertEquals(first, second)
+
+
+def testGrammarLocalNames():
+    print("testGrammarLocalNames")
+
+    def makeGrammar() -> str:
+        hlp = Parser()
+        hlp.defineType('fruit', 'apple{n:int:*}')
+        hlp.defineSentence('Eat {f:list<fruit>} at {t:time}.', None)
+        hlp.defineSentence('Cut {t:tuple<int,x,y>} into {p:[0-9]:3-5} pieces.', None)
+        hlp.compile()
+        return str(hlp.targetGrammar.getBNF())
+
+    # the names of anonymous symbols only depend on the grammar they are part of
+    assertEquals(makeGrammar(), makeGrammar())
+
+
+if __name__ == "__main__":
+    testImportTime()
+    testLazyBuiltins()
+    testDeterministicGrammar()
+    testGrammarLocalNames()
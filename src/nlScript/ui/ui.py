@@ -12,6 +12,8 @@ from PySide2.QtGui import QTextCursor, QKeyEvent, QColor, QPalette, QFont
 from PySide2.QtWidgets import QCompleter, QPlainTextEdit, QApplication, QTextEdit, QItemDelegate, QStyleOptionViewItem, \
     QWidget, QSplitter, QPushButton, QVBoxLayout
 
+from nlScript.completionranker import CompletionRanker
+from nlScript.completionsession import CompletionSession
 from nlScript.core.autocompletion import Autocompletion, Literal, Parameterized, EntireSequence, Purpose
 from nlScript.core.bnf import BNF
 from nlScript.core.matcher import Matcher
@@ -207,6 +209,9 @@ class AutocompletionContext(CodeEditor):
         self.parameterizedCompletion: ParameterizedCompletionContext | None = None
 
         self.parser = parser
+        self._completionSession = CompletionSession(parser)
+        # if set, the autocompletions are ranked and capped before they are shown
+        self.completionRanker: CompletionRanker | None = None
         self.completer = ACPopup(parent)
         self.completer.setWidget(self)
 
@@ -225,6 +230,8 @@ class AutocompletionContext(CodeEditor):
         tc.movePosition(QTextCursor.PreviousCharacter, QTextCursor.KeepAnchor, len(self.completer.completionPrefix()))
 
         repl: str = completion.getCompletion(Purpose.FOR_INSERTION)
+        if self.completionRanker is not None:
+            self.completionRanker.recordUsage(completion)
 
         try:
             repl.index("${")  # throws ValueError if '${' does not exist in completion
@@ -345,11 +352,10 @@ class AutocompletionContext(CodeEditor):
         anchor = self.textCursor().anchor()
 
         textToCursor = entireText[0:anchor]
-        autocompletions: List[Autocompletion] = []
 
         self._errorHighlight.clearError()
         try:
-            self.parser.parse(textToCursor, autocompletions)
+            autocompletions: List[Autocompletion] = self._completionSession.autocomplete(textToCursor)
         except ParseException as e:
             f: Matcher = e.getFirstAutocompletingAncestorThatFailed().matcher
             self._errorHighlight.setError(f.pos, f.pos + len(f.parsed))
@@ -393,6 +399,9 @@ class AutocompletionContext(CodeEditor):
                     self.parameterizedCompletion.next()
                     return
 
+        if self.completionRanker is not None:
+            autocompletions = self.completionRanker.getPage(autocompletions).autocompletions
+
         if len(autocompletions) == 1:
             if autoinsertSingleOption or isinstance(autocompletions[0], Literal):
                 self.completer.setCompletions(autocompletions)
@@ -1,22 +1,98 @@
 from __future__ import annotations
 
+import heapq
 import os
 import stat
 import string
 import sys
-from typing import List, cast
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import List, Tuple, Iterable, cast
 
 
 class CompletePath:
 
-    _filesystemCache = {}
+    # maps a directory to its modification time and its listing, least recently used first
+    _filesystemCache: OrderedDict[str, Tuple[int, List[PathWrapper]]] = OrderedDict()
+    _filesystemCacheLock = threading.Lock()
+    _maxCacheSize = 128
+    _cacheHits = 0
+    _cacheMisses = 0
 
     def __init__(self):
         pass
 
     @staticmethod
     def clearFilesystemCache() -> None:
-        CompletePath._filesystemCache.clear()
+        with CompletePath._filesystemCacheLock:
+            CompletePath._filesystemCache.clear()
+            CompletePath._cacheHits = 0
+            CompletePath._cacheMisses = 0
+
+    @staticmethod
+    def invalidate(directory: str) -> None:
+        """
+        Removes the listing of the given directory from the cache.
+        """
+        with CompletePath._filesystemCacheLock:
+            CompletePath._filesystemCache.pop(directory, None)
+
+    @staticmethod
+    def getMaxCacheSize() -> int:
+        return CompletePath._maxCacheSize
+
+    @staticmethod
+    def setMaxCacheSize(maxCacheSize: int) -> None:
+        """
+        Sets the maximum number of directory listings which are cached. The least recently used ones are discarded first.
+        """
+        if maxCacheSize < 0:
+            raise Exception("The cache size must not be negative")
+        with CompletePath._filesystemCacheLock:
+            CompletePath._maxCacheSize = maxCacheSize
+            while len(CompletePath._filesystemCache) > maxCacheSize:
+                CompletePath._filesystemCache.popitem(last=False)
+
+    @staticmethod
+    def getCacheSize() -> int:
+        return len(CompletePath._filesystemCache)
+
+    @staticmethod
+    def getCacheHits() -> int:
+        return CompletePath._cacheHits
+
+    @staticmethod
+    def getCacheMisses() -> int:
+        return CompletePath._cacheMisses
+
+    @staticmethod
+    def listDirectory(parent: str) -> List[PathWrapper]:
+        """
+        Returns the entries in the given directory. Listings are cached, and a cached listing is
+        only used as long as the modification time of the directory did not change, i.e. as long as no entry
+        was added, removed or renamed.
+        """
+        mtime = os.stat(parent).st_mtime_ns
+        with CompletePath._filesystemCacheLock:
+            entry = CompletePath._filesystemCache.get(parent)
+            if entry is not None and entry[0] == mtime:
+                CompletePath._filesystemCache.move_to_end(parent)
+                CompletePath._cacheHits += 1
+                return entry[1]
+            CompletePath._cacheMisses += 1
+
+        # os.scandir provides the file type of most entries without an additional call to os.stat
+        with os.scandir(parent) as it:
+            listing = [PathWrapper.fromDirEntry(e) for e in it]
+
+        with CompletePath._filesystemCacheLock:
+            if CompletePath._maxCacheSize > 0:
+                CompletePath._filesystemCache[parent] = (mtime, listing)
+                CompletePath._filesystemCache.move_to_end(parent)
+                while len(CompletePath._filesystemCache) > CompletePath._maxCacheSize:
+                    CompletePath._filesystemCache.popitem(last=False)
+        return listing
 
     @staticmethod
     def getParent(alreadyEntered: str) -> str or None:
@@ -52,26 +128,42 @@ class CompletePath:
         return path if not os.path.isabs(path) else os.path.basename(path)
 
     @staticmethod
-    def isHidden(path: str) -> bool:
-        return CompletePath.getFileName(path).startswith(".") or\
-            bool(os.stat(path).st_file_attributes & stat.FILE_ATTRIBUTE_HIDDEN)
+    def isHidden(path: str, st: os.stat_result = None) -> bool:
+        if CompletePath.getFileName(path).startswith("."):
+            return True
+        # file attributes only exist on Windows
+        if not hasattr(stat, "FILE_ATTRIBUTE_HIDDEN"):
+            return False
+        try:
+            if st is None:
+                st = os.stat(path)
+        except OSError:
+            return False
+        return bool(getattr(st, "st_file_attributes", 0) & stat.FILE_ATTRIBUTE_HIDDEN)
 
     @staticmethod
-    def getSiblings(alreadyEntered: str) -> List[str]:
+    def getSiblings(alreadyEntered: str, limit: int or None = None, offset: int = 0) -> List[str]:
+        """
+        Returns the paths in the parent directory of alreadyEntered whose names start with the name entered so far,
+        visible before hidden ones, directories before files, and sorted by name otherwise.
+        If limit is given, only the entries from offset to offset + limit are returned. These are selected with a
+        partial sort, so that the first entries of huge directories are available quickly, and further entries can
+        be requested on demand.
+        """
         parent = CompletePath.getParent(alreadyEntered)
         child = CompletePath.getChild(alreadyEntered)
 
-        # siblingsArray: List[str] or None = None
-
-        if parent in CompletePath._filesystemCache.keys():
-            siblingsArray = CompletePath._filesystemCache.get(parent)
+        if parent is not None:
+            siblingsArray: Iterable[PathWrapper] = CompletePath.listDirectory(parent)
         else:
-            siblingsArray = list(map(lambda x: CompletePath.addSeparator(parent) + x, os.listdir(parent))) if parent is not None else CompletePath.getRootDirectories()
-            CompletePath._filesystemCache[parent] = siblingsArray
+            siblingsArray = map(lambda x: PathWrapper(x), CompletePath.getRootDirectories())
 
-        tmp = filter(lambda x: CompletePath.getFileName(x).lower().startswith(child.lower()), siblingsArray)
-        tmp = sorted(map(lambda x: PathWrapper(x), tmp))
-        # tmp = map(lambda x: x.path + os.path.sep if x.isDirectory and not x.path.endswith(os.path.sep) else x.path, tmp)
+        childLower = child.lower()
+        tmp = filter(lambda x: x.lowerName.startswith(childLower), siblingsArray)
+        if limit is None:
+            tmp = islice(sorted(tmp, key=PathWrapper.sortKey), offset, None)
+        else:
+            tmp = islice(heapq.nsmallest(offset + limit, tmp, key=PathWrapper.sortKey), offset, None)
         tmp = map(lambda x: CompletePath.addSeparator(x.path) if x.isDirectory else x.path, tmp)
         return list(tmp)
 
@@ -80,17 +172,32 @@ class CompletePath:
         return path if path.endswith(os.path.sep) else path + os.path.sep
 
     @staticmethod
-    def getCompletion(alreadyEntered: str) -> List[str]:
-        siblings = CompletePath.getSiblings(alreadyEntered)
-        return [alreadyEntered] if len(siblings) == 0 else siblings
+    def getCompletion(alreadyEntered: str, limit: int or None = None, offset: int = 0) -> List[str]:
+        siblings = CompletePath.getSiblings(alreadyEntered, limit, offset)
+        return [alreadyEntered] if len(siblings) == 0 and offset == 0 else siblings
 
 
 class PathWrapper:
-    def __init__(self, path: str):
+    def __init__(self, path: str, isHidden: bool = None, isDirectory: bool = None):
         self.path = path
         self.name = CompletePath.getFileName(path)
-        self.isHidden = CompletePath.isHidden(path)
-        self.isDirectory = os.path.isdir(path)
+        self.lowerName = self.name.lower()
+        self.isHidden = CompletePath.isHidden(path) if isHidden is None else isHidden
+        self.isDirectory = os.path.isdir(path) if isDirectory is None else isDirectory
+
+    @staticmethod
+    def fromDirEntry(entry: os.DirEntry) -> PathWrapper:
+        try:
+            isDirectory = entry.is_dir()
+        except OSError:
+            isDirectory = False
+        # on Windows, DirEntry.stat() does not need a system call
+        isHidden = entry.name.startswith(".") or \
+            (sys.platform.startswith("win32") and CompletePath.isHidden(entry.path, entry.stat()))
+        return PathWrapper(entry.path, isHidden, isDirectory)
+
+    def sortKey(self) -> Tuple[bool, bool, str]:
+        return self.isHidden, not self.isDirectory, self.name
 
     def __lt__(self, other):
         o = cast(PathWrapper, other)
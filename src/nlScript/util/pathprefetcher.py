@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import List
+
+from nlScript.util.completepath import CompletePath
+
+
+class PathPrefetcher:
+    """
+    Warms the directory cache of CompletePath in background threads, so that listing a directory on a slow
+    (e.g. network) file system does not happen in the completion call itself.
+
+    At most maxPending directories are waiting to be listed; if more are requested, the oldest waiting
+    ones are dropped, because the newest requests are the ones closest to what the user is typing.
+    Requesting a directory never blocks, and waiting for one blocks at most waitTimeout seconds.
+    """
+
+    def __init__(self, nThreads: int = 2, maxPending: int = 16, maxSubdirectories: int = 4, waitTimeout: float = 0.5):
+        self._executor = ThreadPoolExecutor(max_workers=nThreads, thread_name_prefix="PathPrefetcher")
+        self._maxPending = maxPending
+        self._maxSubdirectories = maxSubdirectories
+        self._waitTimeout = waitTimeout
+        self._pending: OrderedDict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    @property
+    def maxPending(self) -> int:
+        return self._maxPending
+
+    @property
+    def maxSubdirectories(self) -> int:
+        return self._maxSubdirectories
+
+    @property
+    def waitTimeout(self) -> float:
+        """
+        The maximum time in seconds for which waitFor() waits for a directory which is being listed.
+        """
+        return self._waitTimeout
+
+    @waitTimeout.setter
+    def waitTimeout(self, waitTimeout: float) -> None:
+        self._waitTimeout = waitTimeout
+
+    def getPending(self) -> List[str]:
+        with self._lock:
+            return list(self._pending.keys())
+
+    def prefetch(self, directory: str) -> Future or None:
+        """
+        Requests the given directory to be listed in the background. Returns the corresponding Future,
+        or None if the prefetcher was shut down.
+        """
+        with self._lock:
+            if self._shutdown:
+                return None
+            future = self._pending.get(directory)
+            if future is not None:
+                self._pending.move_to_end(directory)
+                return future
+            # listings in progress are not dropped, they stay pending until they are done
+            waiting = [f for f in self._pending.values() if not f.running() and not f.done()]
+            dropped: List[Future] = waiting[:max(0, len(waiting) - self._maxPending + 1)]
+            future = self._executor.submit(self.list, directory)
+            self._pending[directory] = future
+        # cancelling runs the done callbacks, which acquire the lock and remove the cancelled futures
+        for f in dropped:
+            f.cancel()
+        future.add_done_callback(lambda f: self.done(directory, f))
+        return future
+
+    def prefetchSubdirectories(self, completions: List[str]) -> None:
+        """
+        Requests the directories which are likely listed next, given the completions for the path entered
+        so far: the first maxSubdirectories directories among them (which end with a path separator).
+        Directories requested earlier, which are not yet listed, are cancelled, since the user has moved on.
+        """
+        self.cancel()
+        subdirectories = [c for c in completions if c.endswith(os.path.sep) and os.path.isabs(c)]
+        for subdirectory in subdirectories[:self._maxSubdirectories]:
+            self.prefetch(subdirectory.rstrip(os.path.sep) or os.path.sep)
+
+    def waitFor(self, directory: str, timeout: float or None = None) -> bool:
+        """
+        If the given directory is being listed in the background, waits until it is done, so that
+        the listing can be taken from the cache instead of listing the directory again, but at most
+        timeout seconds (by default waitTimeout). Returns False if the listing is still in progress.
+        """
+        with self._lock:
+            future = self._pending.get(directory)
+        if future is None:
+            return True
+        done, _ = wait([future], timeout=self._waitTimeout if timeout is None else timeout)
+        return len(done) > 0
+
+    def cancel(self) -> None:
+        """
+        Cancels all directories which are waiting to be listed. Listings in progress are completed,
+        and stay pending until then, so that waitFor() still finds them.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+        # cancelling runs the done callbacks, which acquire the lock and remove the cancelled futures
+        for future in pending:
+            future.cancel()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stops the prefetcher. If wait is True, the directories waiting to be listed are listed first,
+        otherwise they are cancelled.
+        """
+        with self._lock:
+            self._shutdown = True
+        if not wait:
+            self.cancel()
+        self._executor.shutdown(wait=wait)
+
+    @staticmethod
+    def list(directory: str) -> None:
+        try:
+            CompletePath.listDirectory(directory)
+        except OSError:
+            pass
+
+    def done(self, directory: str, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(directory) is future:
+                del self._pending[directory]